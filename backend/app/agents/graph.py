@@ -2,30 +2,78 @@ from langgraph.graph import StateGraph, END
 from typing import Literal
 import logging
 from .state import AgentState
+from ..config import get_settings
 from .nodes.intent import extract_intent
 from .nodes.sql_generator import generate_sql
+from .nodes.fast_path import extract_intent_and_sql
+from .nodes.template_matcher import match_template
+from .nodes.model_router import route_model, escalate_model
 from .nodes.executor import execute_query
 from .nodes.interpreter import interpret_data
 from .nodes.viz_planner import plan_visualization
 from .nodes.viz_generator import generate_viz_code
 from .nodes.insight import generate_insight
 from ..safety.validator import validate_sql_safety
+from ..safety.cost_gate import check_query_cost
+from ..deadline import out_of_time
 
+settings = get_settings()
 logger = logging.getLogger(__name__)
 
-def should_continue_after_validation(state: AgentState) -> Literal["execute", "error"]:
+def route_llm(state: AgentState) -> Literal["fast", "standard"]:
+    # Fast mode answers intent and SQL in one LLM round-trip instead of two
+    if settings.AGENT_FAST_MODE:
+        return "fast"
+    return "standard"
+
+def route_entry(state: AgentState) -> Literal["template", "route"]:
+    if settings.AGENT_TEMPLATES_ENABLED:
+        return "template"
+    return "route"
+
+def route_after_template(state: AgentState) -> Literal["validate", "route"]:
+    if state.get("sql_query"):
+        return "validate"
+    return "route"
+
+def can_escalate(state: AgentState) -> bool:
+    # Only the fast model's failures get a second try, and only with time for one
+    return (
+        state.get("model_route") == "fast"
+        and not state.get("timed_out")
+        and not out_of_time(state, settings.STAGE_MIN_BUDGET)
+    )
+
+def should_continue_after_validation(state: AgentState) -> Literal["check_cost", "execute", "escalate", "error"]:
+    if state.get("sql_valid"):
+        return "check_cost" if settings.COST_GATE_ENABLED else "execute"
+    if can_escalate(state):
+        return "escalate"
+    return "error"
+
+def should_continue_after_cost(
+    state: AgentState,
+) -> Literal["execute", "generate_sql", "extract_intent_and_sql", "route_model", "escalate", "error"]:
+    action = (state.get("cost_estimate") or {}).get("action")
+    if action == "regenerate":
+        # Back to whichever node writes SQL for this configuration
+        if settings.AGENT_FAST_MODE:
+            return "extract_intent_and_sql"
+        return "generate_sql" if state.get("intent") else "route_model"
     if state.get("sql_valid"):
         return "execute"
+    if can_escalate(state):
+        return "escalate"
     return "error"
 
-def should_continue_after_execution(state: AgentState) -> Literal["interpret", "error"]:
+def should_continue_after_execution(state: AgentState) -> Literal["interpret", "escalate", "error"]:
     if state.get("execution_error"):
-        return "error"
-    if state.get("data"):
+        return "escalate" if can_escalate(state) else "error"
+    if state.get("data") is not None:
         return "interpret"
     return "error"
 
-def error_handler(state: AgentState) -> AgentState:
+def error_handler(state: AgentState) -> dict:
     error_msg = (
         state.get("error") or 
         state.get("sql_error") or 
@@ -34,7 +82,6 @@ def error_handler(state: AgentState) -> AgentState:
     )
     logger.error(f"Workflow error: {error_msg}")
     return {
-        **state,
         "insight": f"Error: {error_msg}",
         "viz_code": None
     }
@@ -42,9 +89,14 @@ def error_handler(state: AgentState) -> AgentState:
 # Build graph
 workflow = StateGraph(AgentState)
 
+workflow.add_node("match_template", match_template)
+workflow.add_node("route_model", route_model)
+workflow.add_node("escalate_model", escalate_model)
 workflow.add_node("extract_intent", extract_intent)
 workflow.add_node("generate_sql", generate_sql)
+workflow.add_node("extract_intent_and_sql", extract_intent_and_sql)
 workflow.add_node("validate_sql", validate_sql_safety)
+workflow.add_node("check_cost", check_query_cost)
 workflow.add_node("execute", execute_query)
 workflow.add_node("interpret", interpret_data)
 workflow.add_node("plan_viz", plan_visualization)
@@ -52,20 +104,48 @@ workflow.add_node("generate_viz", generate_viz_code)
 workflow.add_node("generate_insight", generate_insight)
 workflow.add_node("error", error_handler)
 
-workflow.set_entry_point("extract_intent")
+workflow.set_conditional_entry_point(
+    route_entry,
+    {"template": "match_template", "route": "route_model"}
+)
+workflow.add_conditional_edges(
+    "match_template",
+    route_after_template,
+    {"validate": "validate_sql", "route": "route_model"}
+)
+for router_node in ("route_model", "escalate_model"):
+    workflow.add_conditional_edges(
+        router_node,
+        route_llm,
+        {"fast": "extract_intent_and_sql", "standard": "extract_intent"}
+    )
 workflow.add_edge("extract_intent", "generate_sql")
 workflow.add_edge("generate_sql", "validate_sql")
+workflow.add_edge("extract_intent_and_sql", "validate_sql")
 
 workflow.add_conditional_edges(
     "validate_sql",
     should_continue_after_validation,
-    {"execute": "execute", "error": "error"}
+    {"check_cost": "check_cost", "execute": "execute", "escalate": "escalate_model", "error": "error"}
+)
+
+workflow.add_conditional_edges(
+    "check_cost",
+    should_continue_after_cost,
+    {
+        "execute": "execute",
+        "generate_sql": "generate_sql",
+        "extract_intent_and_sql": "extract_intent_and_sql",
+        "route_model": "route_model",
+        "escalate": "escalate_model",
+        "error": "error",
+    }
 )
 
 workflow.add_conditional_edges(
     "execute",
     should_continue_after_execution,
-    {"interpret": "interpret", "error": "error"}
+    {"interpret": "interpret", "escalate": "escalate_model", "error": "error"}
 )
 
 workflow.add_edge("interpret", "plan_viz")
@@ -1,84 +1,116 @@
-import pandas as pd
 from sqlalchemy import text
 import logging
-from ...database import get_db
-import decimal
-import datetime
+from ...config import get_settings
+from ...database import get_async_db
+from ...caching import canonical_sql, referenced_tables
+from ...redis_client import result_cache, sql_cache
+from ...results import ColumnBuffer, ResultSet, column_type_codes, normalize_rows
+from ...deadline import out_of_time, remaining
 
+settings = get_settings()
 logger = logging.getLogger(__name__)
 
-def execute_query(state: dict) -> dict:
+async def fetch_streamed(db, sql_query: str) -> ResultSet:
+    """Read a query through a server-side cursor, one batch at a time.
+    
+    The result is cut, and flagged truncated, at SQL_RESULT_MAX_BYTES.
+    """
+    result = await db.stream(text(sql_query))
+    try:
+        buffer = ColumnBuffer(list(result.keys()), column_type_codes(result), settings.SQL_RESULT_MAX_BYTES)
+        async for batch in result.yield_per(settings.SQL_STREAM_BATCH_ROWS).partitions():
+            if not buffer.append(batch):
+                logger.warning(f"Result exceeded {settings.SQL_RESULT_MAX_BYTES} bytes; "
+                               f"truncated at {buffer.row_count} rows")
+                break
+    finally:
+        # Stop the cursor early if we broke out of the loop
+        await result.close()
+    return buffer.result()
+
+async def fetch_all(db, sql_query: str) -> ResultSet:
+    """Read a query's rows in one go (SQL_STREAMING_ENABLED off)"""
+    result = await db.execute(text(sql_query))
+    
+    # Column names and types first: fetchall() closes the cursor and drops its description
+    columns = list(result.keys())
+    type_codes = column_type_codes(result)
+    rows = result.fetchall()
+    
+    # Convert to JSON-serializable columns by database type (Decimal -> float, dates -> ISO)
+    return ResultSet.from_frame(normalize_rows(rows, columns, type_codes))
+
+async def remember_sql(state: dict):
+    """Cache LLM-written SQL for its intent, once it has run without error"""
+    if not state.get("use_cache") or state.get("sql_source") != "llm" or not state.get("intent"):
+        return
+    if (state.get("cost_estimate") or {}).get("action") == "sample":
+        return  # The rewritten query, not the one the model wrote
+    await sql_cache.set(state["intent"], state["sql_query"])
+
+async def execute_query(state: dict) -> dict:
     """Execute validated SQL query"""
     
     if state.get("error") or state.get("sql_error"):
-        return state
+        return {}
     
     if not state.get("sql_valid"):
-        return {
-            **state,
-            "execution_error": "Cannot execute invalid SQL"
-        }
+        return {"execution_error": "Cannot execute invalid SQL"}
     
     sql_query = state.get("sql_query")
     if not sql_query:
+        return {"execution_error": "No SQL query to execute"}
+    
+    logger.info(f"Executing query: {sql_query}")
+    
+    # Keyed by canonical SQL: different questions that compile to the same
+    # query share one entry, evicted when any table it reads changes
+    cache_key = canonical_sql(sql_query)
+    tables = referenced_tables(sql_query)
+    if state.get("use_cache"):
+        payload = await result_cache.get(cache_key)
+        # Entries written before results were columnar have no "values"
+        if payload is not None and "values" in payload:
+            await remember_sql(state)
+            return {
+                "data": ResultSet.from_payload(payload),
+                "execution_error": None
+            }
+    
+    if out_of_time(state, settings.STAGE_MIN_BUDGET):
         return {
-            **state,
-            "execution_error": "No SQL query to execute"
+            "timed_out": "execute",
+            "execution_error": "Ran out of time before running the query"
         }
     
-    logger.info(f"Executing query: {sql_query}")
+    # Table generations before reading, so a concurrent upload voids the write
+    generations = await result_cache.generations(tables) if state.get("use_cache") else None
     
     try:
-        with get_db() as db:
-            result = db.execute(text(sql_query))
+        async with get_async_db() as db:
+            # Tighten the connection's statement_timeout to the request budget
+            left = remaining(state)
+            if left is not None and left < settings.SQL_QUERY_TIMEOUT:
+                await db.execute(text(f"SET LOCAL statement_timeout = {int(left * 1000)}"))
             
-            # Fetch all rows
-            rows = result.fetchall()
-            columns = list(result.keys())
+            fetch = fetch_streamed if settings.SQL_STREAMING_ENABLED else fetch_all
+            data = await fetch(db, sql_query)
             
-            # Convert to pandas DataFrame
-            data = pd.DataFrame(rows, columns=columns)
+            logger.info(f"Query executed: {data.row_count} rows, columns: {list(data.columns)}")
+            logger.info(f"Column types: {data.dtypes()}")
             
-            # CRITICAL: Convert decimal and datetime objects to JSON-serializable types
-            for col in data.columns:
-                if data[col].dtype == 'object':
-                    # Check if it's numeric but stored as object
-                    try:
-                        data[col] = pd.to_numeric(data[col])
-                    except:
-                        pass
-                    
-                    # Convert decimals to float
-                    if any(isinstance(x, decimal.Decimal) for x in data[col] if x is not None):
-                        data[col] = data[col].apply(lambda x: float(x) if isinstance(x, decimal.Decimal) else x)
-                    
-                    # Convert dates to string
-                    if any(isinstance(x, (datetime.date, datetime.datetime)) for x in data[col] if x is not None):
-                        data[col] = data[col].apply(lambda x: x.isoformat() if isinstance(x, (datetime.date, datetime.datetime)) else x)
-            
-            logger.info(f"Query executed: {len(data)} rows")
-            logger.info(f"Column types: {data.dtypes.to_dict()}")
-            
-            # Convert DataFrame to dict for JSON serialization
-            data_dict = {
-                "columns": columns,
-                "data": data.to_dict(orient="records"),
-                "row_count": len(data)
-            }
-            
-            # Debug log
-            logger.info(f"Returning data with {len(data)} rows, columns: {columns}")
+            if state.get("use_cache"):
+                await result_cache.set(cache_key, data.to_payload(), tables, generations)
+            await remember_sql(state)
             
             return {
-                **state,
-                "data": data_dict,
+                "data": data,
                 "execution_error": None
             }
             
     except Exception as e:
         logger.error(f"Execution error: {e}", exc_info=True)
         return {
-            **state,
             "data": None,
             "execution_error": f"Database error: {str(e)}"
-        }
\ No newline at end of file
+        }
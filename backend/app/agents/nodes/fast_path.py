@@ -0,0 +1,121 @@
+from string import Template
+from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_core.output_parsers import JsonOutputParser
+import logging
+from ...config import get_settings
+from ...caching import normalize_question
+from ...llm import gateway
+from ...deadline import out_of_time, stage_timeout
+from ...schema_registry import schema_registry
+from ...redis_client import intent_cache, sql_cache
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+FAST_SYSTEM_PROMPT = Template("""You are an expert at understanding data analytics questions and writing PostgreSQL.
+
+In one step, extract the intent of the user's query and write the SQL that answers it.
+
+Intent elements:
+- metrics: What are they measuring?
+- dimensions: What are they grouping by?
+- filters: Any conditions?
+- aggregation: How to aggregate?
+- time_range: Any time period?
+- limit: How many results?
+
+SQL rules:
+1. SELECT queries only
+2. ALWAYS include LIMIT (max 10000)
+3. Use proper JOINs
+4. Use aggregate functions when needed
+5. Use GROUP BY with aggregates
+6. Use ORDER BY for sorting
+
+Database schema:
+$schema
+
+Respond with JSON only:
+{
+  "intent": {
+    "metrics": ["total_amount"],
+    "dimensions": ["product_name"],
+    "filters": {},
+    "aggregation": "sum",
+    "limit": 5
+  },
+  "sql": "SELECT ... LIMIT 5"
+}
+""")
+
+async def extract_intent_and_sql(state: dict) -> dict:
+    """Extract intent and generate SQL in a single LLM call (fast mode)"""
+    logger.info(f"Extracting intent and SQL from: {state['user_query']}")
+    
+    cache_key = normalize_question(state["user_query"])
+    # After an escalation or a rejected query, skip what was cached
+    if state.get("use_cache") and state.get("model_route") != "escalated" and not state.get("sql_feedback"):
+        intent = await intent_cache.get(cache_key)
+        sql_query = await sql_cache.get(intent) if intent is not None else None
+        if sql_query:
+            return {
+                "intent": intent,
+                "sql_query": sql_query,
+                "sql_source": "llm",
+                "sql_valid": False,
+                "sql_error": None,
+                "error": None
+            }
+    
+    if out_of_time(state, settings.STAGE_MIN_BUDGET):
+        return {
+            "intent": None,
+            "sql_query": None,
+            "timed_out": "extract_intent_and_sql",
+            "error": "Ran out of time before understanding the query"
+        }
+    
+    try:
+        schema = await schema_registry.context(state["user_query"])
+        prompt = f"Query: {state['user_query']}"
+        if state.get("sql_feedback"):
+            prompt += f"\n\n{state['sql_feedback']}"
+        messages = [
+            SystemMessage(content=FAST_SYSTEM_PROMPT.substitute(schema=schema)),
+            HumanMessage(content=prompt)
+        ]
+        
+        response = await gateway.complete(
+            "fast_path", messages,
+            use_cache=state.get("use_cache", True),
+            timeout=stage_timeout(state, settings.LLM_TIMEOUT),
+            model=state.get("llm_model")
+        )
+        
+        parser = JsonOutputParser()
+        result = parser.parse(response)
+        intent = result["intent"]
+        sql_query = result["sql"].strip()
+        
+        logger.info(f"Extracted intent: {intent}")
+        logger.info(f"Generated SQL: {sql_query}")
+        
+        if state.get("use_cache"):
+            await intent_cache.set(cache_key, intent)
+        
+        return {
+            "intent": intent,
+            "sql_query": sql_query,
+            "sql_source": "llm",
+            "sql_valid": False,
+            "sql_error": None,
+            "error": None
+        }
+        
+    except Exception as e:
+        logger.error(f"Fast path error: {e}")
+        return {
+            "intent": None,
+            "sql_query": None,
+            "error": f"Failed to understand query: {str(e)}"
+        }
@@ -1,4 +1,5 @@
 import logging
+from ...deadline import out_of_time
 import json
 
 logger = logging.getLogger(__name__)
@@ -7,12 +8,17 @@ def generate_insight(state: dict) -> dict:
     """Generate insight from results"""
     
     if state.get("error") or state.get("execution_error"):
-        return state
+        return {}
+    
+    # Partial result: data without an insight
+    if out_of_time(state):
+        return {
+            "timed_out": state.get("timed_out") or "generate_insight"
+        }
     
     data_profile = state.get("data_profile")
     if not data_profile or data_profile.get("type") == "empty":
         return {
-            **state,
             "insight": "No data found."
         }
     
@@ -34,13 +40,11 @@ def generate_insight(state: dict) -> dict:
         logger.info(f"Generated insight: {insight}")
         
         return {
-            **state,
             "insight": insight
         }
         
     except Exception as e:
         logger.error(f"Insight error: {e}")
         return {
-            **state,
             "insight": "Results found."
         }
\ No newline at end of file
@@ -1,21 +1,19 @@
-from langchain_groq import ChatGroq
+from string import Template
 from langchain_core.messages import SystemMessage, HumanMessage
 from langchain_core.output_parsers import JsonOutputParser
 import logging
 import json
 from ...config import get_settings
+from ...caching import normalize_question
+from ...llm import gateway
+from ...deadline import out_of_time, stage_timeout
+from ...schema_registry import schema_registry
+from ...redis_client import intent_cache
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
 
-# Initialize Groq LLM
-llm = ChatGroq(
-    model=settings.GROQ_MODEL,
-    api_key=settings.GROQ_API_KEY,
-    temperature=0,
-)
-
-INTENT_SYSTEM_PROMPT = """You are an expert at understanding data analytics questions.
+INTENT_SYSTEM_PROMPT = Template("""You are an expert at understanding data analytics questions.
 
 Extract these elements from the user's query:
 - metrics: What are they measuring?
@@ -26,10 +24,7 @@ Extract these elements from the user's query:
 - limit: How many results?
 
 Database schema:
-- customers: customer_id, customer_name, email, country, signup_date
-- products: product_id, product_name, category, price, stock_quantity
-- orders: order_id, customer_id, order_date, total_amount, status
-- order_items: item_id, order_id, product_id, quantity, unit_price
+$schema
 
 Respond with JSON only:
 {
@@ -39,28 +34,53 @@ Respond with JSON only:
   "aggregation": "sum",
   "limit": 5
 }
-"""
+""")
 
-def extract_intent(state: dict) -> dict:
+async def extract_intent(state: dict) -> dict:
     """Extract user intent from natural language query"""
     logger.info(f"Extracting intent from: {state['user_query']}")
     
+    cache_key = normalize_question(state["user_query"])
+    # After an escalation the cached answer is likely the fast model's bad one
+    if state.get("use_cache") and state.get("model_route") != "escalated":
+        intent = await intent_cache.get(cache_key)
+        if intent is not None:
+            return {
+                "intent": intent,
+                "error": None
+            }
+    
+    if out_of_time(state, settings.STAGE_MIN_BUDGET):
+        return {
+            "intent": None,
+            "timed_out": "extract_intent",
+            "error": "Ran out of time before understanding the query"
+        }
+    
     try:
+        schema = await schema_registry.context(state["user_query"])
         messages = [
-            SystemMessage(content=INTENT_SYSTEM_PROMPT),
+            SystemMessage(content=INTENT_SYSTEM_PROMPT.substitute(schema=schema)),
             HumanMessage(content=f"Query: {state['user_query']}")
         ]
         
-        response = llm.invoke(messages)
+        response = await gateway.complete(
+            "intent", messages,
+            use_cache=state.get("use_cache", True),
+            timeout=stage_timeout(state, settings.LLM_TIMEOUT),
+            model=state.get("llm_model")
+        )
         
         # Parse JSON
         parser = JsonOutputParser()
-        intent = parser.parse(response.content)
+        intent = parser.parse(response)
         
         logger.info(f"Extracted intent: {intent}")
         
+        if state.get("use_cache"):
+            await intent_cache.set(cache_key, intent)
+        
         return {
-            **state,
             "intent": intent,
             "error": None
         }
@@ -68,7 +88,6 @@ def extract_intent(state: dict) -> dict:
     except Exception as e:
         logger.error(f"Intent extraction error: {e}")
         return {
-            **state,
             "intent": None,
             "error": f"Failed to understand query: {str(e)}"
         }
\ No newline at end of file
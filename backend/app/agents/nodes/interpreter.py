@@ -1,5 +1,5 @@
-import pandas as pd
 import logging
+from ...deadline import out_of_time
 
 logger = logging.getLogger(__name__)
 
@@ -7,58 +7,60 @@ def interpret_data(state: dict) -> dict:
     """Analyze data shape and type"""
     
     if state.get("error") or state.get("execution_error"):
-        return state
+        return {}
     
-    data_dict = state.get("data")
-    if not data_dict:
+    # Out of budget: keep the rows, skip profiling
+    if out_of_time(state):
+        return {
+            "timed_out": state.get("timed_out") or "interpret"
+        }
+    
+    data = state.get("data")
+    if data is None:
         return {
-            **state,
             "data_profile": None
         }
     
     logger.info("Interpreting data")
     
     try:
-        df = pd.DataFrame(data_dict["data"])
-        
-        if df.empty:
+        # Read straight from the shared columnar result; nothing is copied
+        if data.row_count == 0:
             return {
-                **state,
                 "data_profile": {
                     "type": "empty",
                     "message": "No results"
                 }
             }
         
+        columns = list(data.columns)
         profile = {
-            "row_count": len(df),
-            "column_count": len(df.columns),
-            "columns": df.columns.tolist(),
-            "dtypes": {col: str(dtype) for col, dtype in df.dtypes.items()}
+            "row_count": data.row_count,
+            "column_count": len(columns),
+            "columns": columns,
+            "dtypes": data.dtypes()
         }
         
         # Detect type
-        date_cols = [col for col in df.columns if 'date' in col.lower()]
+        date_cols = [col for col in columns if 'date' in col.lower()]
         if date_cols:
             profile["type"] = "time_series"
             profile["time_column"] = date_cols[0]
-        elif len(df.columns) == 2:
+        elif len(columns) == 2:
             profile["type"] = "categorical"
         else:
             profile["type"] = "tabular"
         
-        profile["sample"] = df.head(3).to_dict(orient="records")
+        profile["sample"] = data.head(3)
         
         logger.info(f"Data profile: {profile['type']}")
         
         return {
-            **state,
             "data_profile": profile
         }
         
     except Exception as e:
         logger.error(f"Interpretation error: {e}")
         return {
-            **state,
             "data_profile": {"type": "error", "message": str(e)}
         }
\ No newline at end of file
@@ -0,0 +1,54 @@
+import logging
+from ...config import get_settings
+from ..router import model_router
+from ...schema_registry import schema_registry
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+async def route_model(state: dict) -> dict:
+    """Pick the model for intent and SQL generation by question complexity"""
+    try:
+        await schema_registry.get()
+        index = schema_registry.index
+    except Exception as e:
+        # Without the schema only the question's wording is scored
+        logger.warning(f"Schema unavailable for model routing: {e}")
+        index = None
+    
+    decision = model_router.decide(state["user_query"], index)
+    return {
+        "model_route": decision.route,
+        "llm_model": decision.model,
+    }
+
+def escalate_model(state: dict) -> dict:
+    """Retry intent and SQL generation on the strong model after the fast one failed"""
+    if state.get("execution_error"):
+        reason, detail = "execution", state["execution_error"]
+    elif (state.get("cost_estimate") or {}).get("action") == "reject":
+        reason, detail = "cost", state.get("sql_error")
+    elif state.get("sql_query"):
+        reason, detail = "validation", state.get("sql_error")
+    else:
+        reason, detail = "generation", state.get("sql_error") or state.get("error")
+    
+    model_router.record_escalation(reason)
+    logger.warning(f"Fast model failed {reason} ({detail}); escalating to {settings.GROQ_MODEL}")
+    
+    return {
+        "model_route": "escalated",
+        "llm_model": settings.GROQ_MODEL,
+        "intent": None,
+        "sql_query": None,
+        "sql_source": None,
+        "sql_valid": False,
+        "sql_error": None,
+        # The fast model's rejected SQL isn't feedback for the strong one, and
+        # the strong model gets its own regenerate
+        "sql_feedback": None,
+        "cost_estimate": None,
+        "data": None,
+        "execution_error": None,
+        "error": None
+    }
@@ -1,19 +1,17 @@
-from langchain_groq import ChatGroq
+from string import Template
 from langchain_core.messages import SystemMessage, HumanMessage
 import logging
 import json
 from ...config import get_settings
+from ...llm import gateway
+from ...deadline import out_of_time, stage_timeout
+from ...schema_registry import schema_registry
+from ...redis_client import sql_cache
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
 
-llm = ChatGroq(
-    model=settings.GROQ_MODEL,
-    api_key=settings.GROQ_API_KEY,
-    temperature=0,
-)
-
-SQL_SYSTEM_PROMPT = """You are an expert SQL generator for PostgreSQL.
+SQL_SYSTEM_PROMPT = Template("""You are an expert SQL generator for PostgreSQL.
 
 RULES:
 1. SELECT queries only
@@ -24,30 +22,44 @@ RULES:
 6. Use ORDER BY for sorting
 
 Database schema:
-- customers: customer_id, customer_name, email, country, signup_date
-- products: product_id, product_name, category, price, stock_quantity
-- orders: order_id, customer_id, order_date, total_amount, status
-- order_items: item_id, order_id, product_id, quantity, unit_price
+$schema
 
 Generate ONLY the SQL query, no explanation.
-"""
+""")
 
-def generate_sql(state: dict) -> dict:
+async def generate_sql(state: dict) -> dict:
     """Generate SQL query from intent"""
     
     if state.get("error"):
-        return state
+        return {}
     
     intent = state.get("intent")
     if not intent:
         return {
-            **state,
             "sql_query": None,
             "error": "No intent available"
         }
     
     logger.info(f"Generating SQL for intent: {intent}")
     
+    # Cached SQL for this intent may be the one that just failed
+    if state.get("use_cache") and state.get("model_route") != "escalated" and not state.get("sql_feedback"):
+        sql_query = await sql_cache.get(intent)
+        if sql_query:
+            return {
+                "sql_query": sql_query,
+                "sql_source": "llm",
+                "sql_valid": False,
+                "sql_error": None
+            }
+    
+    if out_of_time(state, settings.STAGE_MIN_BUDGET):
+        return {
+            "sql_query": None,
+            "timed_out": "generate_sql",
+            "error": "Ran out of time before generating SQL"
+        }
+    
     try:
         intent_str = json.dumps(intent, indent=2)
         prompt = f"""Generate SQL for this intent:
@@ -56,14 +68,22 @@ def generate_sql(state: dict) -> dict:
 
 Original question: {state['user_query']}
 """
+        if state.get("sql_feedback"):
+            prompt += f"\n{state['sql_feedback']}\n"
         
+        schema = await schema_registry.context(f"{state['user_query']} {intent_str}")
         messages = [
-            SystemMessage(content=SQL_SYSTEM_PROMPT),
+            SystemMessage(content=SQL_SYSTEM_PROMPT.substitute(schema=schema)),
             HumanMessage(content=prompt)
         ]
         
-        response = llm.invoke(messages)
-        sql_query = response.content.strip()
+        response = await gateway.complete(
+            "sql", messages,
+            use_cache=state.get("use_cache", True),
+            timeout=stage_timeout(state, settings.LLM_TIMEOUT),
+            model=state.get("llm_model")
+        )
+        sql_query = response.strip()
         
         # Remove markdown
         if sql_query.startswith("```"):
@@ -75,8 +95,8 @@ Original question: {state['user_query']}
         logger.info(f"Generated SQL: {sql_query}")
         
         return {
-            **state,
             "sql_query": sql_query,
+            "sql_source": "llm",
             "sql_valid": False,
             "sql_error": None
         }
@@ -84,7 +104,6 @@ Original question: {state['user_query']}
     except Exception as e:
         logger.error(f"SQL generation error: {e}")
         return {
-            **state,
             "sql_query": None,
             "sql_error": f"Failed to generate SQL: {str(e)}"
         }
\ No newline at end of file
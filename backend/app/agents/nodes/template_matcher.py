@@ -0,0 +1,28 @@
+import logging
+from ..templates import template_engine
+from ...schema_registry import schema_registry
+
+logger = logging.getLogger(__name__)
+
+async def match_template(state: dict) -> dict:
+    """Answer common question shapes with rule-based SQL, skipping the LLM"""
+    try:
+        await schema_registry.get()
+        # The index's schema leaves out bookkeeping tables the agent never queries
+        match = template_engine.match(state["user_query"], schema_registry.index.schema)
+    except Exception as e:
+        # Templates are an optimization; the LLM path still answers
+        logger.warning(f"Template matching error: {e}")
+        return {}
+    
+    if match is None:
+        return {}
+    
+    return {
+        "intent": match.intent,
+        "sql_query": match.sql,
+        "sql_source": "template",
+        "sql_valid": False,
+        "sql_error": None,
+        "error": None
+    }
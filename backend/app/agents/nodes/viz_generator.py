@@ -10,7 +10,6 @@ def generate_viz_code(state: dict) -> dict:
     if not viz_plan:
         logger.info("No visualization plan available")
         return {
-            **state,
             "viz_code": "# No visualization generated"
         }
     
@@ -140,6 +139,5 @@ fig.update_layout(
     logger.info("Generated visualization code")
     
     return {
-        **state,
         "viz_code": viz_code
     }
\ No newline at end of file
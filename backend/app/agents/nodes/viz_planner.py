@@ -1,4 +1,5 @@
 import logging
+from ...deadline import out_of_time
 import json
 
 logger = logging.getLogger(__name__)
@@ -7,12 +8,16 @@ def plan_visualization(state: dict) -> dict:
     """Plan visualization based on data type"""
     
     if state.get("error") or state.get("execution_error"):
-        return state
+        return {}
+    
+    if out_of_time(state):
+        return {
+            "timed_out": state.get("timed_out") or "plan_viz"
+        }
     
     data_profile = state.get("data_profile")
     if not data_profile or data_profile.get("type") == "empty":
         return {
-            **state,
             "viz_plan": None
         }
     
@@ -48,13 +53,11 @@ def plan_visualization(state: dict) -> dict:
         logger.info(f"Viz plan: {viz_plan['chart_type']}")
         
         return {
-            **state,
             "viz_plan": viz_plan
         }
         
     except Exception as e:
         logger.error(f"Viz planning error: {e}")
         return {
-            **state,
             "viz_plan": {"chart_type": "bar", "x_axis": "x", "y_axis": "y", "title": "Results"}
         }
\ No newline at end of file
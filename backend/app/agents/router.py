@@ -0,0 +1,108 @@
+"""Complexity-based choice between the fast and the strong LLM"""
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Optional
+import logging
+import re
+from ..config import get_settings
+from ..schema_context import SchemaIndex, tokenize
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+AGGREGATION_WORDS = {
+    "total", "sum", "average", "avg", "mean", "count", "number", "max", "maximum",
+    "min", "minimum", "highest", "lowest", "most", "least", "top", "bottom",
+}
+
+GROUPING_WORDS = {"per", "by", "each", "every", "group", "breakdown"}
+
+# Shapes small models tend to get wrong: windows, subqueries, set logic, ratios
+HARD_WORDS = {
+    "compare", "comparison", "versus", "vs", "growth", "change", "ratio", "percent",
+    "percentage", "share", "rank", "ranking", "cumulative", "running", "median",
+    "percentile", "retention", "cohort", "moving", "rolling", "previous", "prior",
+    "yoy", "excluding", "except", "without", "never", "both", "than",
+}
+
+@dataclass(frozen=True)
+class RouteDecision:
+    """Which model answers a question, and the complexity behind the choice"""
+    route: str  # "fast" or "strong"
+    model: str
+    score: int
+    tables: int
+    aggregations: int
+    hard_terms: int
+
+def _percentile(ordered: list, pct: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+class ModelRouter:
+    """Scores question complexity, picks a model and keeps per-route latencies.
+
+    The score counts joins the question probably needs (relevant tables
+    beyond the first), aggregation and grouping words, and double-counts
+    words for shapes like ratios or window functions. Questions at or below
+    ROUTER_MAX_FAST_COMPLEXITY go to GROQ_FAST_MODEL.
+    """
+    
+    def __init__(self):
+        self.routed = defaultdict(int)
+        self.escalations = defaultdict(int)
+        self.latencies = defaultdict(lambda: deque(maxlen=settings.ROUTER_LATENCY_WINDOW))
+    
+    def decide(self, question: str, index: Optional[SchemaIndex]) -> RouteDecision:
+        # Raw words too: tokenize() drops stopwords like "by" and "top"
+        words = set(tokenize(question)) | set(re.findall(r"[a-z0-9]+", question.lower()))
+        tables = len(index.select(question, settings.SCHEMA_CONTEXT_MAX_TABLES)) if index else 1
+        aggregations = len(words & AGGREGATION_WORDS) + len(words & GROUPING_WORDS)
+        hard_terms = len(words & HARD_WORDS)
+        score = max(tables - 1, 0) + aggregations + 2 * hard_terms
+        
+        if settings.MODEL_ROUTING_ENABLED and score <= settings.ROUTER_MAX_FAST_COMPLEXITY:
+            route, model = "fast", settings.GROQ_FAST_MODEL
+        else:
+            route, model = "strong", settings.GROQ_MODEL
+        
+        self.routed[route] += 1
+        logger.info(f"Routed to {route} model {model} (complexity {score}: {tables} tables, "
+                    f"{aggregations} aggregations, {hard_terms} hard terms)")
+        return RouteDecision(route, model, score, tables, aggregations, hard_terms)
+    
+    def record_escalation(self, reason: str):
+        self.escalations[reason] += 1
+    
+    def record(self, state: dict, seconds: float):
+        """End-to-end latency of one graph run, under the route it took"""
+        route = state.get("model_route") or state.get("sql_source") or "none"
+        self.latencies[route].append(seconds)
+    
+    def stats(self) -> dict:
+        latency = {}
+        for route, samples in self.latencies.items():
+            if not samples:
+                continue
+            ordered = sorted(samples)
+            latency[route] = {
+                "count": len(ordered),
+                "mean_ms": 1000 * sum(ordered) / len(ordered),
+                "p50_ms": 1000 * _percentile(ordered, 0.50),
+                "p95_ms": 1000 * _percentile(ordered, 0.95),
+                "p99_ms": 1000 * _percentile(ordered, 0.99),
+                "max_ms": 1000 * ordered[-1],
+            }
+        
+        fast = self.routed.get("fast", 0)
+        escalated = sum(self.escalations.values())
+        return {
+            "enabled": settings.MODEL_ROUTING_ENABLED,
+            "fast_model": settings.GROQ_FAST_MODEL,
+            "strong_model": settings.GROQ_MODEL,
+            "routed": dict(self.routed),
+            "escalations": dict(self.escalations),
+            "escalation_rate": escalated / fast if fast else 0.0,
+            "latency": latency,
+        }
+
+model_router = ModelRouter()
@@ -1,23 +1,39 @@
-from typing import TypedDict, Optional, Any
-import pandas as pd
+from typing import TypedDict, Optional
+from ..results import ResultSet
 
 class AgentState(TypedDict):
-    """State shared across all agents in the graph"""
+    """State shared across all agents in the graph.
+    
+    Nodes return only the keys they change; LangGraph merges them in.
+    """
     
     # User input
     user_query: str
     use_cache: bool
     
+    # Request budget
+    deadline: Optional[float]  # time.monotonic() by which to answer
+    timed_out: Optional[str]  # Stage that ran out of budget; the rest was skipped
+    
+    # Model routing
+    model_route: Optional[str]  # "fast", "strong" or "escalated"; None for templates
+    llm_model: Optional[str]  # Model for intent and SQL; None: GROQ_MODEL
+    
     # Intent extraction
     intent: Optional[dict]  # {metrics, dimensions, filters, time_range}
     
     # SQL generation
     sql_query: Optional[str]
+    sql_source: Optional[str]  # "template" or "llm"
     sql_valid: bool
     sql_error: Optional[str]
+    sql_feedback: Optional[str]  # Why the last SQL was sent back; shown to the generator
+    
+    # Cost gate
+    cost_estimate: Optional[dict]  # {cost, rows, table, action[, percent]} from EXPLAIN
     
     # Execution
-    data: Optional[Any]  # Will be DataFrame or dict
+    data: Optional[ResultSet]  # Shared by reference; serialized only in the response
     execution_error: Optional[str]
     
     # Interpretation
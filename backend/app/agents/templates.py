@@ -0,0 +1,284 @@
+"""Rule-based SQL for common question shapes, resolved against the live schema"""
+from dataclasses import dataclass
+from typing import Optional, List, Tuple
+import re
+import logging
+from ..config import get_settings
+from ..caching import normalize_question
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+NUMERIC_TYPES = {"smallint", "integer", "bigint", "numeric", "decimal", "real", "double precision"}
+TEXT_TYPES = {"text", "character varying", "character", "varchar", "char"}
+TIME_TYPES = {"date", "timestamp without time zone", "timestamp with time zone"}
+
+# Business words -> column names they usually live in, most specific first
+METRIC_SYNONYMS = {
+    "revenue": ["revenue", "total_revenue", "total_amount", "sales", "total_sales", "amount"],
+    "sales": ["sales", "total_sales", "revenue", "total_amount", "amount"],
+    "spend": ["spend", "total_spend", "total_amount", "amount"],
+    "spending": ["spend", "total_spend", "total_amount", "amount"],
+    "amount": ["amount", "total_amount"],
+    "units": ["units", "units_sold", "quantity"],
+    "quantity": ["quantity", "units", "units_sold"],
+    "price": ["price", "unit_price"],
+    "stock": ["stock", "stock_quantity"],
+}
+
+AGGREGATE_PREFIXES = [
+    ("sum of", "SUM"), ("total", "SUM"),
+    ("average", "AVG"), ("avg", "AVG"), ("mean", "AVG"),
+    ("maximum", "MAX"), ("max", "MAX"), ("highest", "MAX"),
+    ("minimum", "MIN"), ("min", "MIN"), ("lowest", "MIN"),
+]
+
+PERIODS = {
+    "day": "day", "daily": "day",
+    "week": "week", "weekly": "week",
+    "month": "month", "monthly": "month",
+    "quarter": "quarter", "quarterly": "quarter",
+    "year": "year", "yearly": "year", "annual": "year",
+}
+
+LEAD_IN = r"^(?:(?:show|list|give|get|find|plot|chart)(?: me)? |what (?:is|was|are|were) |which are )?(?:the )?"
+TOP_N_PATTERN = re.compile(LEAD_IN + r"(top|bottom) (\d+) (.+?) by (.+)$")
+PER_PERIOD_PATTERN = re.compile(LEAD_IN + r"(.+?) (?:per|by|each|every) (day|week|month|quarter|year)$")
+PERIODIC_PATTERN = re.compile(LEAD_IN + r"(daily|weekly|monthly|quarterly|yearly|annual) (.+)$")
+
+@dataclass(frozen=True)
+class TemplateMatch:
+    """SQL and intent produced by a template, in the shape the LLM nodes emit"""
+    template: str
+    intent: dict
+    sql: str
+
+@dataclass(frozen=True)
+class Metric:
+    table: Optional[str]  # None: count rows of whichever table is chosen
+    column: Optional[str]  # None: COUNT(*)
+    aggregation: str
+    
+    @property
+    def alias(self) -> str:
+        if self.column is None:
+            return f"{_singular(self.table)}_count" if self.table else "row_count"
+        if self.aggregation == "SUM":
+            return f"total_{self.column}" if not self.column.startswith("total_") else self.column
+        return f"{self.aggregation.lower()}_{self.column}"
+    
+    def expression(self, qualifier: str = "") -> str:
+        if self.column is None:
+            return "COUNT(*)"
+        return f'{self.aggregation}({qualifier}"{self.column}")'
+
+def _singular(word: str) -> str:
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("ses", "xes", "ches", "shes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+def _identifier(phrase: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", phrase.strip()).strip("_")
+
+def _columns(schema: dict, table: str) -> List[dict]:
+    return schema.get(table, [])
+
+def _find_table(schema: dict, phrase: str) -> Optional[str]:
+    name = _singular(_identifier(phrase))
+    for table in schema:
+        if _singular(table.lower()) == name:
+            return table
+    return None
+
+def _find_column(schema: dict, table: str, names: List[str], types: set) -> Optional[str]:
+    by_name = {col["name"].lower(): col for col in _columns(schema, table)}
+    for name in names:
+        col = by_name.get(name)
+        if col and col["type"] in types:
+            return col["name"]
+    return None
+
+def _dimensions(schema: dict, phrase: str) -> List[Tuple[str, str]]:
+    """Candidate (table, column) pairs for a grouping phrase, best first"""
+    name = _identifier(phrase)
+    names = [name, _singular(name), f"{_singular(name)}_name", f"{name}_name"]
+    candidates = []
+    for table in schema:
+        column = _find_column(schema, table, names, TEXT_TYPES)
+        if column:
+            candidates.append((table, column))
+    
+    # "products" -> the products table's name-like column
+    table = _find_table(schema, phrase)
+    if table:
+        text_columns = [col["name"] for col in _columns(schema, table) if col["type"] in TEXT_TYPES]
+        named = [col for col in text_columns if "name" in col.lower()]
+        if named or text_columns:
+            candidates.append((table, (named or text_columns)[0]))
+    return candidates
+
+def _metrics(schema: dict, phrase: str) -> List[Metric]:
+    """Candidate metrics for a measure phrase, best first"""
+    aggregation = "SUM"
+    for prefix, agg in AGGREGATE_PREFIXES:
+        if phrase.startswith(prefix + " "):
+            aggregation, phrase = agg, phrase[len(prefix) + 1:]
+            break
+    
+    count = re.match(r"^(?:number|count|#) of (.+)$", phrase) or re.match(r"^(.+?) count$", phrase)
+    if count:
+        table = _find_table(schema, count.group(1))
+        return [Metric(table, None, "COUNT")] if table or count.group(1) in ("rows", "records") else []
+    
+    name = _identifier(phrase)
+    names = [name] + METRIC_SYNONYMS.get(name, [])
+    candidates = []
+    for table in schema:
+        column = _find_column(schema, table, names, NUMERIC_TYPES)
+        if column:
+            candidates.append((names.index(column.lower()), Metric(table, column, aggregation)))
+    candidates.sort(key=lambda candidate: candidate[0])
+    metrics = [metric for _, metric in candidates]
+    
+    # "orders" as a measure means how many of them
+    table = _find_table(schema, phrase)
+    if table and aggregation == "SUM":
+        metrics.append(Metric(table, None, "COUNT"))
+    return metrics
+
+def _key_column(schema: dict, table: str) -> Optional[str]:
+    """The table's id column, taken to be its first column when named like one"""
+    columns = _columns(schema, table)
+    if columns and columns[0]["name"].lower().endswith("id"):
+        return columns[0]["name"]
+    return None
+
+def _entity_key(schema: dict, table: str, phrase: str) -> Optional[str]:
+    """Key to group by when the phrase names the table's rows ("customers").
+
+    Names needn't be unique, so each row is ranked by its key. A phrase that
+    names a column instead ("regions") groups by that column's values.
+    """
+    if _find_table(schema, phrase) != table:
+        return None
+    return _key_column(schema, table)
+
+def _join_column(schema: dict, dimension_table: str, metric_table: str) -> Optional[str]:
+    """Key of the dimension table that the metric table references.
+
+    Only many-to-one joins are allowed, so the metric is never fanned out.
+    """
+    key = _key_column(schema, dimension_table)
+    if key and any(col["name"] == key for col in _columns(schema, metric_table)):
+        return key
+    return None
+
+def _time_column(schema: dict, table: str) -> Optional[str]:
+    columns = [col["name"] for col in _columns(schema, table) if col["type"] in TIME_TYPES]
+    dated = [col for col in columns if "date" in col.lower()]
+    return (dated or columns or [None])[0]
+
+class TemplateEngine:
+    """Matches question shapes and fills SQL from the schema, counting hits"""
+    
+    def __init__(self):
+        self.matched = 0
+        self.unmatched = 0
+        self.by_template: dict = {}
+    
+    def match(self, question: str, schema: dict) -> Optional[TemplateMatch]:
+        text = normalize_question(question)
+        result = self._top_n(text, schema) or self._per_period(text, schema)
+        
+        if result:
+            self.matched += 1
+            self.by_template[result.template] = self.by_template.get(result.template, 0) + 1
+            logger.info(f"Template {result.template} matched: {result.sql}")
+        else:
+            self.unmatched += 1
+        return result
+    
+    def _top_n(self, text: str, schema: dict) -> Optional[TemplateMatch]:
+        match = TOP_N_PATTERN.match(text)
+        if not match:
+            return None
+        direction, limit, dimension_phrase, metric_phrase = match.groups()
+        limit = int(limit)
+        if not 0 < limit <= settings.SQL_MAX_ROWS:
+            return None
+        
+        order = "DESC" if direction == "top" else "ASC"
+        for table, column in _dimensions(schema, dimension_phrase):
+            entity_key = _entity_key(schema, table, dimension_phrase)
+            for metric in _metrics(schema, metric_phrase):
+                if metric.table in (None, table):
+                    group_by = f'"{entity_key}", "{column}"' if entity_key else f'"{column}"'
+                    sql = (f'SELECT "{column}", {metric.expression()} AS {metric.alias} '
+                           f'FROM "{table}" GROUP BY {group_by} '
+                           f'ORDER BY {metric.alias} {order} NULLS LAST LIMIT {limit}')
+                else:
+                    key = _join_column(schema, table, metric.table)
+                    if not key:
+                        continue
+                    group_by = f'd."{entity_key}", d."{column}"' if entity_key else f'd."{column}"'
+                    sql = (f'SELECT d."{column}", {metric.expression("m.")} AS {metric.alias} '
+                           f'FROM "{table}" d JOIN "{metric.table}" m ON m."{key}" = d."{key}" '
+                           f'GROUP BY {group_by} '
+                           f'ORDER BY {metric.alias} {order} NULLS LAST LIMIT {limit}')
+                
+                intent = {
+                    "metrics": [metric.column or metric.alias],
+                    "dimensions": [column],
+                    "filters": {},
+                    "aggregation": metric.aggregation.lower(),
+                    "limit": limit,
+                }
+                return TemplateMatch("top_n", intent, sql)
+        return None
+    
+    def _per_period(self, text: str, schema: dict) -> Optional[TemplateMatch]:
+        match = PER_PERIOD_PATTERN.match(text)
+        if match:
+            metric_phrase, period = match.groups()
+        else:
+            match = PERIODIC_PATTERN.match(text)
+            if not match:
+                return None
+            period, metric_phrase = match.groups()
+        period = PERIODS[period]
+        
+        for metric in _metrics(schema, metric_phrase):
+            if metric.table is None:
+                continue
+            time_column = _time_column(schema, metric.table)
+            if not time_column:
+                continue
+            sql = (f"SELECT DATE_TRUNC('{period}', \"{time_column}\")::date AS {period}, "
+                   f'{metric.expression()} AS {metric.alias} '
+                   f'FROM "{metric.table}" WHERE "{time_column}" IS NOT NULL '
+                   f'GROUP BY 1 ORDER BY 1 LIMIT {settings.SQL_MAX_ROWS}')
+            intent = {
+                "metrics": [metric.column or metric.alias],
+                "dimensions": [period],
+                "filters": {},
+                "aggregation": metric.aggregation.lower(),
+                "time_range": f"per {period}",
+                "limit": settings.SQL_MAX_ROWS,
+            }
+            return TemplateMatch("metric_per_period", intent, sql)
+        return None
+    
+    def stats(self) -> dict:
+        total = self.matched + self.unmatched
+        return {
+            "matched": self.matched,
+            "unmatched": self.unmatched,
+            "match_rate": self.matched / total if total else 0.0,
+            "by_template": dict(self.by_template),
+        }
+
+template_engine = TemplateEngine()
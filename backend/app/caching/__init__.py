@@ -0,0 +1,14 @@
+from .local import LocalCache
+from .stages import StageCache, TableCache, normalize_question, canonical_sql, referenced_tables
+from .codecs import encode_payload, decode_payload
+
+__all__ = [
+    "LocalCache",
+    "StageCache",
+    "TableCache",
+    "normalize_question",
+    "canonical_sql",
+    "referenced_tables",
+    "encode_payload",
+    "decode_payload",
+]
@@ -0,0 +1,91 @@
+"""Pluggable serialization for cached payloads.
+
+Binary payloads start with a 4-byte header: MAGIC followed by a codec id.
+Anything without the header is a legacy JSON entry, so both formats can live
+in Redis side by side while old entries age out.
+
+Responses and result sets are cached columnar already (``values`` holds one
+list per column), so msgpack packs them as they are.
+"""
+from typing import Any
+import json
+import zlib
+import msgpack
+
+MAGIC = b"\x00AC"
+
+# msgpack extension type that earlier versions wrote for lists of records.
+# Nothing writes it any more; it is still read so those entries decode
+# until they expire.
+COLUMNAR_EXT = 1
+
+class JSONCodec:
+    """Legacy text format, written without a header"""
+
+    id = None
+    name = "json"
+
+    def encode(self, value: Any) -> bytes:
+        return json.dumps(value, default=str).encode()
+
+    def decode(self, data: bytes) -> Any:
+        return json.loads(data)
+
+class MsgpackCodec:
+    """msgpack, optionally zlib-compressed"""
+
+    def __init__(self, id: int, name: str, compress: bool, level: int = 1):
+        self.id = id
+        self.name = name
+        self.compress = compress
+        self.level = level
+
+    def encode(self, value: Any) -> bytes:
+        return self.wrap(_pack(value))
+
+    def wrap(self, body: bytes) -> bytes:
+        """Add the header (and compression) to an already packed body"""
+        if self.compress:
+            body = zlib.compress(body, self.level)
+        return MAGIC + bytes([self.id]) + body
+
+    def decode(self, data: bytes) -> Any:
+        body = data[len(MAGIC) + 1:]
+        if self.compress:
+            body = zlib.decompress(body)
+        return msgpack.unpackb(body, raw=False, ext_hook=_from_columnar)
+
+def _pack(value: Any) -> bytes:
+    return msgpack.packb(value, default=str, use_bin_type=True)
+
+def _from_columnar(code: int, data: bytes) -> Any:
+    if code != COLUMNAR_EXT:
+        return msgpack.ExtType(code, data)
+    columns, arrays = msgpack.unpackb(data, raw=False)
+    return [dict(zip(columns, row)) for row in zip(*arrays)]
+
+JSON = JSONCodec()
+MSGPACK = MsgpackCodec(id=1, name="msgpack", compress=False)
+MSGPACK_ZLIB = MsgpackCodec(id=2, name="msgpack+zlib", compress=True)
+
+CODECS = {codec.id: codec for codec in (MSGPACK, MSGPACK_ZLIB)}
+
+def encode_payload(value: Any, codec: str = "auto", compress_min_bytes: int = 16384) -> bytes:
+    """Encode a cache payload.
+
+    "auto" writes msgpack and compresses it once the encoded body
+    reaches `compress_min_bytes`; "json" keeps writing the legacy format.
+    """
+    if codec == JSON.name:
+        return JSON.encode(value)
+
+    body = _pack(value)
+    if len(body) >= compress_min_bytes:
+        return MSGPACK_ZLIB.wrap(body)
+    return MSGPACK.wrap(body)
+
+def decode_payload(data: bytes) -> Any:
+    """Decode any payload written by encode_payload, including legacy JSON"""
+    if isinstance(data, bytes) and data.startswith(MAGIC):
+        return CODECS[data[len(MAGIC)]].decode(data)
+    return JSON.decode(data)
@@ -0,0 +1,92 @@
+"""Request coalescing: concurrent identical requests share one execution"""
+from typing import Any, Awaitable, Callable, Optional
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+    """Single-flight deduplication within a process and across workers.
+
+    Within a process, callers for the same key await one shared task. Across
+    workers, the task takes a Redis lease before running; a worker that finds
+    the lease taken polls `lookup` (normally the response cache) until the
+    owner publishes a result, and runs the work itself only if the lease is
+    released or expires without one.
+    """
+
+    def __init__(self, cache, lease_ttl: int, wait_timeout: int, poll_interval: float):
+        self.cache = cache
+        self.lease_ttl = lease_ttl
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self._inflight: dict = {}
+        self._waiters: dict = {}
+        self.leader_runs = 0
+        self.coalesced = 0
+        self.remote_hits = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]],
+                 lookup: Callable[[], Awaitable[Optional[Any]]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(key, fn, lookup))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+            logger.info(f"Coalesced onto in-flight request: {key[:50]}...")
+
+        # Shield so one caller disconnecting doesn't cancel the shared run;
+        # the run is cancelled only once every caller has gone away
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            result = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters[key] == 1 and not task.done():
+                logger.info(f"All callers gone, cancelling: {key[:50]}...")
+                task.cancel()
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+        return dict(result) if isinstance(result, dict) else result
+
+    async def _run(self, key: str, fn: Callable[[], Awaitable[Any]],
+                   lookup: Callable[[], Awaitable[Optional[Any]]]) -> Any:
+        deadline = time.monotonic() + self.wait_timeout
+
+        while not (token := await self.cache.acquire_lease(key, self.lease_ttl)):
+            if time.monotonic() >= deadline:
+                logger.warning(f"Gave up waiting for lease holder: {key[:50]}...")
+                break
+            await asyncio.sleep(self.poll_interval)
+            result = await lookup()
+            if result is not None:
+                self.remote_hits += 1
+                logger.info(f"Served result computed by another worker: {key[:50]}...")
+                return result
+        else:
+            # We hold the lease; it may have been freed just after a result landed
+            result = await lookup()
+            if result is not None:
+                await self.cache.release_lease(key, token)
+                self.remote_hits += 1
+                return result
+
+        self.leader_runs += 1
+        try:
+            return await fn()
+        finally:
+            if token:
+                await self.cache.release_lease(key, token)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._inflight),
+            "leader_runs": self.leader_runs,
+            "coalesced": self.coalesced,
+            "remote_hits": self.remote_hits,
+        }
@@ -0,0 +1,208 @@
+"""Per-stage memoization for the agent graph (intent, SQL, result sets)"""
+from typing import Any, Iterable, List, Optional
+import hashlib
+import json
+import logging
+import re
+import sqlglot
+
+logger = logging.getLogger(__name__)
+
+def normalize_question(question: str) -> str:
+    """Case- and whitespace-insensitive form of a question"""
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip("?.! ")
+
+def canonical_sql(sql: str) -> str:
+    """Formatting-insensitive form of a query, falling back to the raw text"""
+    try:
+        return sqlglot.parse_one(sql, read="postgres").sql(dialect="postgres", normalize=True)
+    except Exception:
+        return " ".join(sql.split())
+
+def referenced_tables(sql: str) -> List[str]:
+    """Tables a query reads (CTE names excluded), lowercased; [] if it doesn't parse"""
+    try:
+        parsed = sqlglot.parse_one(sql, read="postgres")
+    except Exception:
+        return []
+    ctes = {cte.alias_or_name.lower() for cte in parsed.find_all(sqlglot.exp.CTE)}
+    tables = {table.name.lower() for table in parsed.find_all(sqlglot.exp.Table)}
+    return sorted(tables - ctes)
+
+# Write an entry only if none of its tables were invalidated since it was read
+SET_IF_CURRENT_SCRIPT = """
+local n = tonumber(ARGV[3])
+for i = 1, n do
+    if (redis.call("get", KEYS[1 + i]) or "0") ~= ARGV[3 + i] then
+        return 0
+    end
+end
+redis.call("setex", KEYS[1], ARGV[1], ARGV[2])
+for i = 1, n do
+    redis.call("sadd", KEYS[1 + n + i], KEYS[1])
+    redis.call("expire", KEYS[1 + n + i], ARGV[1])
+end
+return 1
+"""
+
+# Bump a table's generation and delete every entry that read it
+INVALIDATE_TABLE_SCRIPT = """
+redis.call("incr", KEYS[1])
+local members = redis.call("smembers", KEYS[2])
+for i = 1, #members, 500 do
+    redis.call("del", unpack(members, i, math.min(i + 499, #members)))
+end
+redis.call("del", KEYS[2])
+return #members
+"""
+
+class StageCache:
+    """Redis-backed memo for one graph stage, with its own TTL and counters"""
+
+    def __init__(self, cache, name: str, ttl: int, versioned: bool = False):
+        self.cache = cache
+        self.name = name
+        self.ttl = ttl
+        # Versioned stages also key on the schema version
+        self.versioned = versioned
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    async def _generate_key(self, key: Any) -> Optional[str]:
+        content = json.dumps(key, sort_keys=True, default=str)
+        if self.versioned:
+            schema_version = await self.cache.get_schema_version()
+            if not schema_version:
+                return None
+            content = f"{content}:{schema_version}"
+        return f"analytics:{self.name}:{hashlib.sha256(content.encode()).hexdigest()}"
+
+    async def get(self, key: Any) -> Optional[Any]:
+        if not self.cache.available():
+            return None
+        try:
+            cache_key = await self._generate_key(key)
+            data = await self.cache.execute("get", cache_key) if cache_key else None
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            logger.info(f"{self.name} cache HIT")
+            return self.cache.decode(data)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"{self.name} cache GET error: {e}")
+            return None
+
+    async def set(self, key: Any, value: Any) -> bool:
+        if not self.cache.available():
+            return False
+        try:
+            cache_key = await self._generate_key(key)
+            if not cache_key:
+                return False
+            await self.cache.execute("setex", cache_key, self.ttl, self.cache.encode(value))
+            return True
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"{self.name} cache SET error: {e}")
+            return False
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "ttl": self.ttl,
+        }
+
+class TableCache(StageCache):
+    """StageCache whose entries record the tables they were computed from.
+
+    Entries aren't keyed by the schema version: changing one table evicts
+    only the entries that read it (invalidate_tables), so everything else
+    survives uploads and deletes of unrelated tables.
+
+    Each table also has a generation, bumped on invalidation. Callers read
+    the generations before computing a value and pass them to set(), which
+    drops the write if a table changed in between, so a result read from
+    the old table can't be cached after its invalidation.
+    """
+
+    def __init__(self, cache, name: str, ttl: int):
+        super().__init__(cache, name, ttl)
+        self.invalidations = 0
+        self.evicted = 0
+        self.rejected = 0
+
+    def _generation_key(self, table: str) -> str:
+        return f"analytics:{self.name}:generation:{table}"
+
+    def _dependents_key(self, table: str) -> str:
+        return f"analytics:{self.name}:dependents:{table}"
+
+    async def generations(self, tables: List[str]) -> Optional[List[str]]:
+        """Current generation of each table, or None if Redis can't say"""
+        if not tables:
+            return []
+        if not self.cache.available():
+            return None
+        try:
+            values = await self.cache.execute("mget", [self._generation_key(table) for table in tables])
+            return [value.decode() if value else "0" for value in values]
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"{self.name} cache generation error: {e}")
+            return None
+
+    async def set(self, key: Any, value: Any, tables: List[str] = (),
+                  generations: Optional[List[str]] = None) -> bool:
+        """Store an entry under its tables, unless one changed since `generations`"""
+        if generations is None or len(generations) != len(tables) or not self.cache.available():
+            return False
+        try:
+            cache_key = await self._generate_key(key)
+            keys = [cache_key, *map(self._generation_key, tables), *map(self._dependents_key, tables)]
+            stored = await self.cache.execute(
+                "eval", SET_IF_CURRENT_SCRIPT, len(keys), *keys,
+                self.ttl, self.cache.encode(value), len(tables), *generations,
+            )
+            if not stored:
+                self.rejected += 1
+                logger.info(f"{self.name} cache SET skipped: {', '.join(tables)} changed while computing")
+            return bool(stored)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"{self.name} cache SET error: {e}")
+            return False
+
+    async def invalidate_tables(self, tables: Iterable[str]) -> int:
+        """Evict every entry that read any of the tables; returns how many"""
+        if not self.cache.available():
+            return 0
+        evicted = 0
+        try:
+            for table in {table.lower() for table in tables}:
+                evicted += await self.cache.execute(
+                    "eval", INVALIDATE_TABLE_SCRIPT, 2,
+                    self._generation_key(table), self._dependents_key(table),
+                )
+                self.invalidations += 1
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"{self.name} cache invalidation error: {e}")
+        self.evicted += evicted
+        logger.info(f"{self.name} cache: evicted {evicted} entries for {', '.join(tables)}")
+        return evicted
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "invalidations": self.invalidations,
+            "evicted": self.evicted,
+            "rejected_writes": self.rejected,
+        }
@@ -1,6 +1,7 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
 from pathlib import Path
+from typing import Optional
 import os
 
 # Get the backend directory
@@ -14,11 +15,78 @@ class Settings(BaseSettings):
     
     # Redis
     REDIS_URL: str
-    REDIS_TTL: int = 300
+    REDIS_TTL: int = 21600
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_POOL_TIMEOUT: float = 0.5
+    REDIS_SOCKET_TIMEOUT: float = 1.0
+    REDIS_BREAKER_THRESHOLD: int = 3
+    REDIS_BREAKER_RESET_TIMEOUT: float = 10.0
+    
+    # In-process L1 cache in front of Redis
+    CACHE_L1_ENABLED: bool = False
+    CACHE_L1_MAX_ENTRIES: int = 256
+    CACHE_L1_MAX_BYTES: int = 64 * 1024 * 1024
+    CACHE_L1_TTL: int = 60
+    
+    # Stale-while-revalidate: serve expired entries for this long while refreshing
+    CACHE_SWR_ENABLED: bool = False
+    CACHE_STALE_TTL: int = 3600
+    
+    # Cache payload codec: "auto" (msgpack, zlib above the threshold) or "json"
+    CACHE_CODEC: str = "auto"
+    CACHE_COMPRESS_MIN_BYTES: int = 16384
+    
+    # Per-stage memoization TTLs
+    INTENT_CACHE_TTL: int = 86400
+    SQL_CACHE_TTL: int = 86400
+    RESULT_CACHE_TTL: int = 3600  # By canonical SQL; uploads/deletes evict only entries reading that table
+    
+    # Request coalescing for identical concurrent questions
+    SINGLEFLIGHT_ENABLED: bool = True
+    SINGLEFLIGHT_LEASE_TTL: int = 60
+    SINGLEFLIGHT_WAIT_TIMEOUT: int = 60
+    SINGLEFLIGHT_POLL_INTERVAL: float = 0.2
+    
+    # Cache warm-up from query history (startup and schema changes)
+    WARMUP_ENABLED: bool = True
+    WARMUP_TOP_N: int = 50
+    WARMUP_CONCURRENCY: int = 4
+    QUERY_HISTORY_MAX: int = 1000  # Distinct questions kept; the least asked are dropped
+    
+    # /query/batch
+    BATCH_MAX_QUESTIONS: int = 200
+    BATCH_CONCURRENCY: int = 4  # Graph runs at once, across batches; capped at DB_POOL_SIZE
     
     # Groq
-    GROQ_API_KEY: str
+    GROQ_API_KEY: str = ""  # Not needed with LLM_PROVIDER=replay
     GROQ_MODEL: str = "llama-3.3-70b-versatile"
+    GROQ_FAST_MODEL: str = "llama-3.1-8b-instant"  # For simple questions; see MODEL_ROUTING_ENABLED
+    
+    # LLM provider: groq (live), record (live, saving completions) or replay (offline)
+    LLM_PROVIDER: str = "groq"
+    LLM_RECORDING_PATH: str = "recordings/llm.jsonl"
+    LLM_REPLAY_LATENCY_MS: Optional[float] = None  # None: replay the recorded latency
+    LLM_REPLAY_JITTER_MS: float = 0.0
+    LLM_REPLAY_SEED: int = 0
+    
+    # Agent
+    AGENT_FAST_MODE: bool = False  # Intent + SQL in a single LLM call
+    AGENT_TEMPLATES_ENABLED: bool = True  # Rule-based SQL for common question shapes
+    
+    # Model routing: simple questions go to GROQ_FAST_MODEL, retried on GROQ_MODEL if its SQL fails
+    MODEL_ROUTING_ENABLED: bool = True
+    ROUTER_MAX_FAST_COMPLEXITY: int = 3
+    ROUTER_LATENCY_WINDOW: int = 1000  # Latest runs per route kept for percentiles
+    
+    # Schema context sent to the LLM (relevant tables only)
+    SCHEMA_CONTEXT_MAX_TABLES: int = 8
+    SCHEMA_CONTEXT_MAX_COLUMNS: int = 30
+    
+    # LLM completion cache (temperature 0, keyed by model + messages)
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_TTL: int = 86400
+    LLM_CACHE_L1_MAX_ENTRIES: int = 512
+    LLM_CACHE_L1_MAX_BYTES: int = 16 * 1024 * 1024
     
     # OpenTelemetry
     OTEL_ENABLED: bool = True
@@ -30,6 +98,31 @@ class Settings(BaseSettings):
     SQL_MAX_ROWS: int = 10000
     SQL_MAX_JOINS: int = 3
     
+    # Cost gate: EXPLAIN validated SQL and act on planner estimates over these limits
+    COST_GATE_ENABLED: bool = True
+    COST_GATE_MAX_COST: float = 1_000_000.0  # Planner cost units (root Total Cost)
+    COST_GATE_MAX_ROWS: float = 10_000_000.0  # Largest row estimate of any plan node
+    COST_GATE_ACTION: str = "regenerate"  # reject, sample or regenerate (once, then reject)
+    COST_GATE_SAMPLE_PERCENT: float = 1.0  # TABLESAMPLE SYSTEM percentage for "sample"
+    COST_CACHE_TTL: int = 3600
+    
+    # Result streaming (server-side cursor, converted batch by batch)
+    SQL_STREAMING_ENABLED: bool = True
+    SQL_STREAM_BATCH_ROWS: int = 1000
+    SQL_RESULT_MAX_BYTES: int = 32 * 1024 * 1024  # Larger results are truncated and flagged
+    
+    # Result handles: /query inlines the first page, /results/{id} serves the rest from Redis
+    RESULT_PAGE_ROWS: int = 500
+    RESULT_PAGE_MAX_ROWS: int = 5000  # Largest page /results/{id} will serve
+    RESULT_CHUNK_ROWS: int = 1000  # Rows per stored chunk; a page read fetches only the chunks it spans
+    RESULT_HANDLE_TTL: int = 3600  # Renewed whenever a cached response hands the id out again
+    
+    # Request deadlines
+    QUERY_TIMEOUT: float = 30.0  # Default and maximum end-to-end budget per question
+    LLM_TIMEOUT: float = 20.0  # Ceiling for a single LLM call
+    STAGE_MIN_BUDGET: float = 0.5  # Don't start an LLM/DB stage with less time left
+    DISCONNECT_POLL_INTERVAL: float = 0.5
+    
     # API
     API_PORT: int = 8000
     DEBUG: bool = False
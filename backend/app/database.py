@@ -1,8 +1,11 @@
 from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import QueuePool
-from contextlib import contextmanager
+from contextlib import contextmanager, asynccontextmanager
+import hashlib
 import logging
 from .config import get_settings
 
@@ -29,6 +32,20 @@ def set_timeout(dbapi_conn, connection_record):
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Async engine for the agent graph (asyncpg driver, same credentials and limits)
+async_engine = create_async_engine(
+    make_url(settings.DATABASE_URL).set(drivername="postgresql+asyncpg"),
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_pre_ping=True,
+    echo=settings.DEBUG,
+    connect_args={
+        "server_settings": {"statement_timeout": str(settings.SQL_QUERY_TIMEOUT * 1000)}
+    },
+)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 @contextmanager
 def get_db():
     """Context manager for database sessions"""
@@ -42,6 +59,17 @@ def get_db():
     finally:
         db.close()
 
+@asynccontextmanager
+async def get_async_db():
+    """Async context manager for database sessions"""
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except Exception as e:
+            logger.error(f"Database error: {e}")
+            await db.rollback()
+            raise
+
 def get_schema_info() -> dict:
     """Extract database schema for LLM context"""
     with get_db() as db:
@@ -68,4 +96,61 @@ def get_schema_info() -> dict:
                 {"name": col[0], "type": col[1]} for col in columns
             ]
     
-    return schema
\ No newline at end of file
+    return schema
+
+async def get_schema_info_async() -> dict:
+    """Async variant of get_schema_info (one round-trip for all tables)"""
+    async with get_async_db() as db:
+        columns = (await db.execute(text("""
+            SELECT c.table_name, c.column_name, c.data_type
+            FROM information_schema.columns c
+            JOIN information_schema.tables t
+              ON t.table_schema = c.table_schema AND t.table_name = c.table_name
+            WHERE c.table_schema = 'public'
+            AND t.table_type = 'BASE TABLE'
+            ORDER BY c.table_name, c.ordinal_position
+        """))).fetchall()
+
+    schema = {}
+    for table_name, column_name, data_type in columns:
+        schema.setdefault(table_name, []).append({"name": column_name, "type": data_type})
+    return schema
+
+async def get_table_descriptions() -> dict:
+    """Descriptions of uploaded tables from the data source registry"""
+    async with get_async_db() as db:
+        try:
+            rows = (await db.execute(text("""
+                SELECT table_name, description FROM data_sources
+            """))).fetchall()
+        except Exception as e:
+            logger.warning(f"Could not read data_sources descriptions: {e}")
+            await db.rollback()
+            rows = []
+    
+    return {table_name: description for table_name, description in rows if description}
+
+async def compute_schema_version() -> str:
+    """Fingerprint the public schema DDL and the data source registry"""
+    async with get_async_db() as db:
+        columns = (await db.execute(text("""
+            SELECT table_name, column_name, data_type
+            FROM information_schema.columns
+            WHERE table_schema = 'public'
+            ORDER BY table_name, ordinal_position
+        """))).fetchall()
+        
+        # Re-uploading a CSV with identical columns only shows up here
+        try:
+            sources = (await db.execute(text("""
+                SELECT table_name, row_count, uploaded_at
+                FROM data_sources
+                ORDER BY table_name
+            """))).fetchall()
+        except Exception as e:
+            logger.warning(f"Could not read data_sources for schema version: {e}")
+            await db.rollback()
+            sources = []
+    
+    content = repr([tuple(row) for row in columns]) + repr([tuple(row) for row in sources])
+    return hashlib.sha256(content.encode()).hexdigest()[:16]
@@ -0,0 +1,28 @@
+"""Request deadlines carried in AgentState"""
+from typing import Optional
+import time
+from .config import get_settings
+
+settings = get_settings()
+
+def deadline_after(seconds: Optional[float]) -> float:
+    """Deadline for a request, capped at QUERY_TIMEOUT"""
+    budget = min(seconds, settings.QUERY_TIMEOUT) if seconds else settings.QUERY_TIMEOUT
+    return time.monotonic() + budget
+
+def remaining(state: dict) -> Optional[float]:
+    """Seconds left before the deadline, or None when there is none"""
+    deadline = state.get("deadline")
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+def out_of_time(state: dict, reserve: float = 0.0) -> bool:
+    """Whether less than `reserve` seconds are left"""
+    left = remaining(state)
+    return left is not None and left <= reserve
+
+def stage_timeout(state: dict, ceiling: float) -> float:
+    """Timeout for one stage: its own ceiling, or whatever is left if less"""
+    left = remaining(state)
+    return ceiling if left is None else max(0.0, min(ceiling, left))
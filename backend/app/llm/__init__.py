@@ -0,0 +1,12 @@
+from .gateway import LLMGateway, gateway
+from .providers import LLMProvider, GroqProvider, RecordingProvider, ReplayProvider, build_provider
+
+__all__ = [
+    "LLMGateway",
+    "gateway",
+    "LLMProvider",
+    "GroqProvider",
+    "RecordingProvider",
+    "ReplayProvider",
+    "build_provider",
+]
@@ -0,0 +1,150 @@
+"""Shared entry point for chat completions: memoized and metered per node"""
+from collections import defaultdict
+from typing import Callable, List, Optional
+import asyncio
+import logging
+import time
+from langchain_core.messages import BaseMessage
+from ..config import get_settings
+from ..caching import LocalCache, StageCache
+from ..redis_client import llm_cache
+from .providers import LLMProvider, build_provider, completion_key
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+class NodeStats:
+    """Cache and call counters for one agent node"""
+    
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.calls = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.input_tokens = 0
+        self.output_tokens = 0
+    
+    def record_call(self, latency: float, usage: dict):
+        self.calls += 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+        self.input_tokens += usage.get("input_tokens", 0)
+        self.output_tokens += usage.get("output_tokens", 0)
+    
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "calls": self.calls,
+            "avg_latency_ms": 1000 * self.latency_total / self.calls if self.calls else 0.0,
+            "max_latency_ms": 1000 * self.latency_max,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+        }
+
+class LLMGateway:
+    """Runs every node's LLM calls through one client and one completion cache.
+    
+    Nodes call with temperature 0, so a completion is a pure function of the
+    model and the messages. Completions are cached under a hash of both, in a
+    bounded in-process store and in Redis (shared by all workers).
+    """
+    
+    def __init__(self, client: LLMProvider, model: str, cache: StageCache, local: Optional[LocalCache],
+                 factory: Callable[[str], LLMProvider] = build_provider):
+        self.client = client
+        self.model = model
+        self.cache = cache
+        self.local = local
+        self.factory = factory
+        self.clients = {}
+        self.nodes = defaultdict(NodeStats)
+        self.models = defaultdict(NodeStats)
+    
+    def _client(self, model: str) -> LLMProvider:
+        if model == self.model:
+            return self.client
+        if model not in self.clients:
+            self.clients[model] = self.factory(model)
+        return self.clients[model]
+    
+    async def complete(self, node: str, messages: List[BaseMessage], use_cache: bool = True,
+                       timeout: Optional[float] = None, model: Optional[str] = None) -> str:
+        """Completion text for the messages, from cache when possible.
+        
+        `model` defaults to GROQ_MODEL. Raises TimeoutError if the model
+        doesn't answer within `timeout` seconds (default LLM_TIMEOUT).
+        """
+        timeout = settings.LLM_TIMEOUT if timeout is None else timeout
+        model = model or self.model
+        stats = self.nodes[node]
+        model_stats = self.models[model]
+        # A recording run must call the provider for every prompt, or replay can't serve it
+        use_cache = use_cache and settings.LLM_CACHE_ENABLED and settings.LLM_PROVIDER != "record"
+        key = completion_key(model, messages)
+        
+        if use_cache:
+            content = self.local.get(key) if self.local else None
+            if content is None:
+                content = await self.cache.get(key)
+                if content is not None and self.local:
+                    self.local.set(key, content, size=len(content.encode()))
+            if content is not None:
+                stats.hits += 1
+                model_stats.hits += 1
+                logger.info(f"LLM cache HIT for {node}")
+                return content
+        
+        stats.misses += 1
+        model_stats.misses += 1
+        start = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(self._client(model).ainvoke(messages), timeout)
+        except asyncio.TimeoutError:
+            for counter in (stats, model_stats):
+                counter.errors += 1
+                counter.timeouts += 1
+            raise TimeoutError(f"LLM call for {node} on {model} timed out after {timeout:.1f}s")
+        except Exception:
+            stats.errors += 1
+            model_stats.errors += 1
+            raise
+        latency = time.perf_counter() - start
+        usage = getattr(response, "usage_metadata", None) or {}
+        stats.record_call(latency, usage)
+        model_stats.record_call(latency, usage)
+        content = response.content
+        
+        if use_cache:
+            if self.local:
+                self.local.set(key, content, size=len(content.encode()))
+            await self.cache.set(key, content)
+        return content
+    
+    def stats(self) -> dict:
+        return {
+            "model": self.model,
+            "provider": type(self.client).__name__,
+            "l1": self.local.stats() if self.local else None,
+            "l2": self.cache.stats(),
+            "nodes": {node: stats.stats() for node, stats in self.nodes.items()},
+            "models": {model: stats.stats() for model, stats in self.models.items()},
+        }
+
+gateway = LLMGateway(
+    client=build_provider(),
+    model=settings.GROQ_MODEL,
+    cache=llm_cache,
+    local=LocalCache(
+        max_entries=settings.LLM_CACHE_L1_MAX_ENTRIES,
+        max_bytes=settings.LLM_CACHE_L1_MAX_BYTES,
+        ttl=settings.LLM_CACHE_TTL,
+    ),
+)
@@ -0,0 +1,150 @@
+"""Chat model backends for the LLM gateway, selected by LLM_PROVIDER"""
+from abc import ABC, abstractmethod
+from types import SimpleNamespace
+from typing import Any, List, Optional
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from langchain_core.messages import BaseMessage
+from ..config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+def completion_key(model: str, messages: List[BaseMessage]) -> str:
+    """Content address of a prompt: the same model and messages give the same key"""
+    content = json.dumps({
+        "model": model,
+        "messages": [[message.type, message.content] for message in messages],
+    })
+    return hashlib.sha256(content.encode()).hexdigest()
+
+class LLMProvider(ABC):
+    """A chat model: `ainvoke(messages)` returns an object with `.content`
+    and, when known, `.usage_metadata` (langchain's chat model contract)."""
+    
+    model: str
+    
+    @abstractmethod
+    async def ainvoke(self, messages: List[BaseMessage]) -> Any:
+        ...
+
+class GroqProvider(LLMProvider):
+    """Live Groq API. The client is created on first use, so importing the
+    app doesn't need an API key."""
+    
+    def __init__(self, model: str, api_key: str):
+        self.model = model
+        self.api_key = api_key
+        self._client = None
+    
+    async def ainvoke(self, messages: List[BaseMessage]) -> Any:
+        if self._client is None:
+            if not self.api_key:
+                raise RuntimeError("GROQ_API_KEY is not set (or use LLM_PROVIDER=replay)")
+            from langchain_groq import ChatGroq
+            self._client = ChatGroq(model=self.model, api_key=self.api_key, temperature=0)
+        return await self._client.ainvoke(messages)
+
+class RecordingProvider(LLMProvider):
+    """Passes calls through to another provider and appends each prompt,
+    completion, token usage and latency to a JSONL file for replay."""
+    
+    def __init__(self, inner: LLMProvider, path: str):
+        self.inner = inner
+        self.model = inner.model
+        self.path = path
+        self._lock = threading.Lock()
+    
+    async def ainvoke(self, messages: List[BaseMessage]) -> Any:
+        start = time.perf_counter()
+        response = await self.inner.ainvoke(messages)
+        record = {
+            "key": completion_key(self.model, messages),
+            "model": self.model,
+            "messages": [[message.type, message.content] for message in messages],
+            "content": response.content,
+            "usage": getattr(response, "usage_metadata", None) or {},
+            "latency_ms": (time.perf_counter() - start) * 1000,
+        }
+        await asyncio.to_thread(self._append, record)
+        return response
+    
+    def _append(self, record: dict):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+class ReplayProvider(LLMProvider):
+    """Serves recorded completions back without any network access.
+
+    Each call sleeps for a synthetic latency: the recorded one by default,
+    or a fixed `latency_ms`, plus up to `jitter_ms` of seeded (so
+    repeatable) noise. A prompt that was never recorded is an error.
+    The recording is read on first use, so a missing file fails the first
+    call with a clear message instead of the app's startup.
+    """
+    
+    def __init__(self, model: str, path: str, latency_ms: Optional[float] = None,
+                 jitter_ms: float = 0.0, seed: int = 0):
+        self.model = model
+        self.path = path
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self._random = random.Random(seed)
+        self.records: Optional[dict] = None
+    
+    def _load(self) -> dict:
+        if not os.path.isfile(self.path):
+            raise RuntimeError(
+                f"No LLM recording at LLM_RECORDING_PATH={self.path!r}; "
+                "record one first with LLM_PROVIDER=record"
+            )
+        records = {}
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    # Latest recording wins
+                    records[record["key"]] = record
+        logger.info(f"Loaded {len(records)} recorded completions from {self.path}")
+        return records
+    
+    async def ainvoke(self, messages: List[BaseMessage]) -> Any:
+        if self.records is None:
+            self.records = self._load()
+        record = self.records.get(completion_key(self.model, messages))
+        if record is None:
+            raise LookupError(f"No recorded completion for this prompt in {self.path}")
+        
+        latency_ms = record.get("latency_ms", 0.0) if self.latency_ms is None else self.latency_ms
+        latency_ms += self._random.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0
+        await asyncio.sleep(latency_ms / 1000)
+        return SimpleNamespace(content=record["content"], usage_metadata=record.get("usage") or {})
+
+def build_provider(model: Optional[str] = None) -> LLMProvider:
+    """The provider named by LLM_PROVIDER (groq, record or replay) for a model"""
+    model = model or settings.GROQ_MODEL
+    groq = lambda: GroqProvider(model, settings.GROQ_API_KEY)
+    
+    if settings.LLM_PROVIDER == "groq":
+        return groq()
+    if settings.LLM_PROVIDER == "record":
+        logger.info(f"Recording LLM completions to {settings.LLM_RECORDING_PATH}")
+        return RecordingProvider(groq(), settings.LLM_RECORDING_PATH)
+    if settings.LLM_PROVIDER == "replay":
+        return ReplayProvider(
+            model,
+            settings.LLM_RECORDING_PATH,
+            latency_ms=settings.LLM_REPLAY_LATENCY_MS,
+            jitter_ms=settings.LLM_REPLAY_JITTER_MS,
+            seed=settings.LLM_REPLAY_SEED,
+        )
+    raise ValueError(f"Unknown LLM_PROVIDER: {settings.LLM_PROVIDER}")
@@ -1,16 +1,30 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
+from typing import List, Optional
+import asyncio
 import logging
 from .config import get_settings
 from .database import get_schema_info
-from .redis_client import cache
+from .redis_client import cache, stage_caches, result_store, result_cache
 from .observability.tracer import setup_telemetry, instrument_app
-from .agents import agent_graph, AgentState
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from .pipeline import answer_query, answer_batch, stream_query, singleflight
+from .agents.templates import template_engine
+from .agents.router import model_router
+from .safety.cost_gate import cost_gate
+from .llm import gateway
+from .warmup import warmer
+from .results import (
+    ARROW, COLUMNAR, ARROW_MEDIA_TYPE, COLUMNAR_MEDIA_TYPE,
+    negotiate, format_summary, format_response, to_arrow, decode_cursor,
+)
+from fastapi import FastAPI, HTTPException, UploadFile, File, Request, Query
+from starlette.concurrency import run_in_threadpool
 from .data_sources.manager import DataSourceManager
 import pandas as pd
 import io
+import json
 
 # Setup logging
 logging.basicConfig(
@@ -46,22 +60,32 @@ app.add_middleware(
 class QueryRequest(BaseModel):
     query: str
     use_cache: bool = True
+    timeout: Optional[float] = None  # Seconds; defaults to (and capped at) QUERY_TIMEOUT
+
+class BatchQueryRequest(BaseModel):
+    queries: List[str]
+    use_cache: bool = True
+    timeout: Optional[float] = None  # Per question
 
 class QueryResponse(BaseModel):
     sql: str
     visualization_code: str
     insight: str
+    # Rows as "data" (records) or "values" (columnar), see app/results/formats.py. Results
+    # over RESULT_PAGE_ROWS carry the first page plus result_id/next_cursor for /results/{id}
     data_summary: dict
     cached: bool = False
+    stale: bool = False
+    partial: bool = False  # Ran out of time; later stages (viz, insight) missing
 
 @app.get("/health")
 async def health_check():
     """System health check"""
     db_healthy = True
-    redis_healthy = cache.health_check()
+    redis_healthy = await cache.health_check()
     
     try:
-        get_schema_info()
+        await run_in_threadpool(get_schema_info)
     except:
         db_healthy = False
     
@@ -71,82 +95,109 @@ async def health_check():
         "redis": "ok" if redis_healthy else "error",
     }
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe - not ready until the startup cache warm-up finishes"""
+    progress = warmer.progress()
+    if not progress["ready"]:
+        return JSONResponse(status_code=503, content=progress)
+    return progress
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Per-tier and per-stage cache hit/miss counters"""
+    return {
+        **cache.stats(),
+        "stages": {stage.name: stage.stats() for stage in stage_caches},
+        "singleflight": singleflight.stats(),
+        "results": result_store.stats(),
+    }
+
+@app.get("/agent/stats")
+async def get_agent_stats():
+    """Template match rate, model routing, cost gate and per-node LLM cache, latency and token counters"""
+    return {
+        "templates": template_engine.stats(),
+        "routing": model_router.stats(),
+        "cost_gate": cost_gate.stats(),
+        "llm": gateway.stats(),
+    }
+
 @app.get("/schema")
 async def get_database_schema():
     """Return database schema for reference"""
     try:
-        schema = get_schema_info()
+        schema = await run_in_threadpool(get_schema_info)
         return {"schema": schema}
     except Exception as e:
         logger.error(f"Schema fetch error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def cancel_on_disconnect(http_request: Request, coro):
+    """Await coro, cancelling it if the client goes away first"""
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=settings.DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                logger.info("Client disconnected, cancelling query")
+                # 499: client closed request (nobody reads it)
+                raise HTTPException(status_code=499, detail="Client disconnected")
+    finally:
+        if not task.done():
+            task.cancel()
+
+def result_format(http_request: Request, requested: Optional[str], allow_arrow: bool = True) -> str:
+    """Negotiated result layout, or a 400 for one we can't serve"""
+    try:
+        fmt = negotiate(http_request.headers.get("accept"), requested)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if fmt == ARROW and not allow_arrow:
+        raise HTTPException(status_code=400, detail="Arrow is only available from /query and /results")
+    return fmt
+
+def format_event(event: dict, fmt: str) -> dict:
+    """An NDJSON event with any rows it carries in the requested layout"""
+    if event.get("event") == "execute":
+        return {**event, "data": format_summary(event["data"], fmt)}
+    if event.get("event") == "result" and isinstance(event.get("data"), dict):
+        return {**event, "data": format_response(event["data"], fmt)}
+    return event
+
 @app.post("/query", response_model=QueryResponse)
-async def process_query(request: QueryRequest):
-    """Main endpoint - processes natural language query through agent graph"""
+async def process_query(
+    request: QueryRequest,
+    http_request: Request,
+    requested_format: Optional[str] = Query(None, alias="format", description="records, columnar or arrow; overrides Accept"),
+):
+    """Main endpoint - processes natural language query through agent graph.
     
-    logger.info(f"Processing query: {request.query}")
+    Rows come back as records (default, application/json), columnar JSON
+    (application/vnd.analytics-agent.columnar+json) or an Arrow IPC stream
+    (application/vnd.apache.arrow.stream), by Accept header or ?format=.
+    """
     
-    # Check cache first
-    if request.use_cache:
-        cached_result = cache.get(request.query)
-        if cached_result:
-            logger.info("Returning cached result")
-            cached_result["cached"] = True
-            return cached_result
+    logger.info(f"Processing query: {request.query}")
+    fmt = result_format(http_request, requested_format)
     
     try:
-        # Initialize agent state
-        initial_state: AgentState = {
-            "user_query": request.query,
-            "use_cache": request.use_cache,
-            "intent": None,
-            "sql_query": None,
-            "sql_valid": False,
-            "sql_error": None,
-            "data": None,
-            "execution_error": None,
-            "data_profile": None,
-            "viz_plan": None,
-            "viz_code": None,
-            "insight": None,
-            "error": None
-        }
-        
-        # Run through agent graph
-        logger.info("Starting agent graph execution")
-        final_state = agent_graph.invoke(initial_state)
-        
-        # Extract data from final state
-        data_dict = final_state.get("data", {})
-        data_profile = final_state.get("data_profile", {})
-        
-        # Build response with proper structure
-        response = {
-            "sql": final_state.get("sql_query") or "N/A",
-            "visualization_code": final_state.get("viz_code") or "# No visualization generated",
-            "insight": final_state.get("insight") or "Unable to generate insight",
-            "data_summary": {
-                "row_count": data_dict.get("row_count", 0),  # ← Fixed!
-                "columns": data_dict.get("columns", []),      # ← Fixed!
-                "type": data_profile.get("type", "unknown"),
-                "data": data_dict.get("data", [])             # ← CRITICAL FIX!
-            },
-            "cached": False
-        }
-        
-        # Debug logging
-        logger.info(f"Response data_summary: row_count={response['data_summary']['row_count']}, "
-                   f"columns={response['data_summary']['columns']}, "
-                   f"data_len={len(response['data_summary']['data'])}")
-        
-        # Cache successful results
-        if request.use_cache and not final_state.get("error"):
-            cache.set(request.query, response)
-        
+        response = await cancel_on_disconnect(
+            http_request,
+            answer_query(request.query, request.use_cache, request.timeout)
+        )
         logger.info("Query processed successfully")
-        return response
         
+        if fmt == ARROW:
+            return Response(content=to_arrow(response), media_type=ARROW_MEDIA_TYPE)
+        if fmt == COLUMNAR:
+            return JSONResponse(content=format_response(response, fmt), media_type=COLUMNAR_MEDIA_TYPE)
+        return format_response(response, fmt)
+        
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Query processing error: {e}", exc_info=True)
         raise HTTPException(
@@ -154,6 +205,103 @@ async def process_query(request: QueryRequest):
             detail=f"Failed to process query: {str(e)}"
         )
     
+@app.post("/query/stream")
+async def process_query_stream(
+    request: QueryRequest,
+    http_request: Request,
+    requested_format: Optional[str] = Query(None, alias="format", description="records or columnar"),
+):
+    """Streaming /query - one NDJSON event per finished agent stage, then the result"""
+    
+    logger.info(f"Streaming query: {request.query}")
+    fmt = result_format(http_request, requested_format, allow_arrow=False)
+    
+    async def events():
+        try:
+            # Starlette cancels this generator, and the graph run, on disconnect
+            async for event in stream_query(request.query, request.use_cache, request.timeout):
+                yield json.dumps(format_event(event, fmt), default=str) + "\n"
+        except Exception as e:
+            logger.error(f"Query streaming error: {e}", exc_info=True)
+            yield json.dumps({"event": "error", "data": {"detail": f"Failed to process query: {str(e)}"}}) + "\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="application/x-ndjson",
+        # Stop proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/query/batch")
+async def process_query_batch(
+    request: BatchQueryRequest,
+    http_request: Request,
+    requested_format: Optional[str] = Query(None, alias="format", description="records or columnar"),
+):
+    """Answer many questions; NDJSON, one event per unique question as it completes"""
+    
+    fmt = result_format(http_request, requested_format, allow_arrow=False)
+    
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="No queries given")
+    if len(request.queries) > settings.BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many queries: {len(request.queries)} (max: {settings.BATCH_MAX_QUESTIONS})"
+        )
+    
+    logger.info(f"Processing batch of {len(request.queries)} queries")
+    
+    async def events():
+        try:
+            async for event in answer_batch(request.queries, request.use_cache, request.timeout):
+                yield json.dumps(format_event(event, fmt), default=str) + "\n"
+        except Exception as e:
+            logger.error(f"Batch processing error: {e}", exc_info=True)
+            yield json.dumps({"event": "error", "data": {"detail": f"Failed to process batch: {str(e)}"}}) + "\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/results/{result_id}")
+async def get_result_page(
+    result_id: str,
+    http_request: Request,
+    cursor: Optional[str] = Query(None, description="next_cursor from /query or the previous page"),
+    limit: Optional[int] = Query(None, ge=1, le=settings.RESULT_PAGE_MAX_ROWS, description="Rows per page"),
+    columns: Optional[str] = Query(None, description="Comma-separated subset of columns"),
+    requested_format: Optional[str] = Query(None, alias="format", description="records, columnar or arrow; overrides Accept"),
+):
+    """A page of a stored query result, by the result_id /query handed out.
+    
+    Pages follow each other through next_cursor, which is null on the last
+    page. Results expire RESULT_HANDLE_TTL seconds after /query last served
+    them; an expired id is a 404 and the question has to be asked again.
+    """
+    fmt = result_format(http_request, requested_format)
+    
+    try:
+        start = decode_cursor(result_id, cursor) if cursor else 0
+        names = [name.strip() for name in columns.split(",") if name.strip()] if columns else None
+        page = await result_store.page(result_id, start, limit or settings.RESULT_PAGE_ROWS, names)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Result page error: {e}", exc_info=True)
+        raise HTTPException(status_code=503, detail="Result store unavailable")
+    
+    if page is None:
+        raise HTTPException(status_code=404, detail="Result not found or expired")
+    
+    if fmt == ARROW:
+        return Response(content=to_arrow({"data_summary": page}), media_type=ARROW_MEDIA_TYPE)
+    if fmt == COLUMNAR:
+        return JSONResponse(content=page, media_type=COLUMNAR_MEDIA_TYPE)
+    return format_summary(page, fmt)
+
 # Initialize data source manager
 data_source_manager = None
 
@@ -164,6 +312,17 @@ async def startup_event():
     data_source_manager = DataSourceManager(settings.DATABASE_URL)
     logger.info("Data source manager initialized")
 
+    # The schema may have changed while we were down
+    await cache.refresh_schema_version()
+    cache.start_invalidation_listener()
+    warmer.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background cache work and release Redis connections"""
+    await warmer.stop()
+    await cache.close()
+
 @app.post("/upload-csv")
 async def upload_csv(file: UploadFile = File(...), table_name: str = None, description: str = ""):
     """Upload CSV file and create table"""
@@ -180,9 +339,15 @@ async def upload_csv(file: UploadFile = File(...), table_name: str = None, descr
         table_name = ''.join(c for c in table_name if c.isalnum() or c == '_')
         
         # Upload
-        result = data_source_manager.upload_csv(df, table_name, description)
+        result = await run_in_threadpool(data_source_manager.upload_csv, df, table_name, description)
+        
+        # Only cached results that read this table are stale; the rest survive.
+        # Even a failed upload may have dropped the old table already.
+        await result_cache.invalidate_tables([table_name])
         
         if result["success"]:
+            await cache.refresh_schema_version()
+            warmer.start()
             return result
         else:
             raise HTTPException(status_code=400, detail=result.get("error", "Upload failed"))
@@ -195,7 +360,7 @@ async def upload_csv(file: UploadFile = File(...), table_name: str = None, descr
 async def get_data_sources():
     """Get all available data sources"""
     try:
-        sources = data_source_manager.get_all_sources()
+        sources = await run_in_threadpool(data_source_manager.get_all_sources)
         return {"sources": sources}
     except Exception as e:
         logger.error(f"Error getting data sources: {e}")
@@ -205,7 +370,7 @@ async def get_data_sources():
 async def get_table_info(table_name: str):
     """Get detailed info about a table"""
     try:
-        info = data_source_manager.get_table_info(table_name)
+        info = await run_in_threadpool(data_source_manager.get_table_info, table_name)
         if info:
             return info
         else:
@@ -218,8 +383,11 @@ async def get_table_info(table_name: str):
 async def delete_data_source(table_name: str):
     """Delete a data source"""
     try:
-        result = data_source_manager.delete_source(table_name)
+        result = await run_in_threadpool(data_source_manager.delete_source, table_name)
+        await result_cache.invalidate_tables([table_name])
         if result["success"]:
+            await cache.refresh_schema_version()
+            warmer.start()
             return result
         else:
             raise HTTPException(status_code=400, detail=result.get("error", "Delete failed"))
@@ -54,8 +54,8 @@ def instrument_app(app):
         FastAPIInstrumentor.instrument_app(app)
         
         # Instrument SQLAlchemy
-        from ..database import engine
-        SQLAlchemyInstrumentor().instrument(engine=engine)
+        from ..database import engine, async_engine
+        SQLAlchemyInstrumentor().instrument(engines=[engine, async_engine.sync_engine])
         
         # Instrument Redis
         RedisInstrumentor().instrument()
@@ -0,0 +1,347 @@
+"""Answer a question: cache lookup, request coalescing and the agent graph"""
+from typing import AsyncIterator, List, Optional
+import asyncio
+import logging
+import time
+from .config import get_settings
+from .redis_client import cache, result_store
+from .results import encode_cursor
+from .caching import normalize_question
+from .caching.singleflight import SingleFlight
+from .agents import agent_graph, AgentState
+from .deadline import deadline_after
+from .agents.router import model_router
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+singleflight = SingleFlight(
+    cache,
+    lease_ttl=settings.SINGLEFLIGHT_LEASE_TTL,
+    wait_timeout=settings.SINGLEFLIGHT_WAIT_TIMEOUT,
+    poll_interval=settings.SINGLEFLIGHT_POLL_INTERVAL,
+)
+
+def build_initial_state(query: str, use_cache: bool, timeout: Optional[float] = None) -> AgentState:
+    """Fresh agent state for a question, due within `timeout` seconds"""
+    return {
+        "user_query": query,
+        "use_cache": use_cache,
+        "deadline": deadline_after(timeout),
+        "timed_out": None,
+        "model_route": None,
+        "llm_model": None,
+        "intent": None,
+        "sql_query": None,
+        "sql_source": None,
+        "sql_valid": False,
+        "sql_error": None,
+        "sql_feedback": None,
+        "cost_estimate": None,
+        "data": None,
+        "execution_error": None,
+        "data_profile": None,
+        "viz_plan": None,
+        "viz_code": None,
+        "insight": None,
+        "error": None
+    }
+
+def build_response(final_state: dict, result_id: Optional[str] = None) -> dict:
+    """Shape the final graph state into a /query response.
+    
+    With a result handle only the first page of rows is inline; the
+    handle's next_cursor continues from there via /results/{id}.
+    """
+    data = final_state.get("data")
+    page_rows = settings.RESULT_PAGE_ROWS if result_id else None
+    data_dict = data.to_columnar(page_rows) if data is not None else {}
+    data_profile = final_state.get("data_profile") or {}
+    timed_out = final_state.get("timed_out")
+    cost_estimate = final_state.get("cost_estimate") or {}
+
+    return {
+        "sql": final_state.get("sql_query") or "N/A",
+        "visualization_code": final_state.get("viz_code") or "# No visualization generated",
+        "insight": final_state.get("insight") or (
+            "Ran out of time before generating an insight" if timed_out else "Unable to generate insight"
+        ),
+        "data_summary": {
+            "row_count": data_dict.get("row_count", 0),
+            "columns": data_dict.get("columns", []),
+            "type": data_profile.get("type", "unknown"),
+            # Columnar; main.py lays it out as the client asked
+            "values": data_dict.get("values", []),
+            "truncated": data_dict.get("truncated", False),
+            # Percent of each table read when the cost gate downgraded to a sample
+            "sampled": cost_estimate.get("percent") if cost_estimate.get("action") == "sample" else None,
+            "result_id": result_id,
+            "next_cursor": encode_cursor(result_id, page_rows) if result_id else None
+        },
+        "cached": False,
+        "partial": bool(timed_out)
+    }
+
+async def store_result(final_state: dict) -> Optional[str]:
+    """Put a result bigger than one page behind a handle.
+    
+    None for small results, and when Redis is down: the response then
+    carries every row, as it did before handles.
+    """
+    data = final_state.get("data")
+    if data is None or data.row_count <= settings.RESULT_PAGE_ROWS:
+        return None
+    return await result_store.put(data)
+
+async def finish_response(final_state: dict) -> dict:
+    """build_response, storing the result behind a handle first if it is large"""
+    return build_response(final_state, await store_result(final_state))
+
+def handle_of(response: Optional[dict]) -> Optional[str]:
+    return ((response or {}).get("data_summary") or {}).get("result_id")
+
+async def drop_expired_handles(responses: List[Optional[dict]]) -> List[Optional[dict]]:
+    """Cached responses whose result handle has expired count as misses.
+    
+    The live handles get their TTL renewed, so a response served from the
+    cache can always be paged through.
+    """
+    indices = [i for i, response in enumerate(responses) if handle_of(response)]
+    alive = await result_store.touch([handle_of(responses[i]) for i in indices])
+    responses = list(responses)
+    for i, ok in zip(indices, alive):
+        if not ok:
+            logger.info(f"Result handle {handle_of(responses[i])} expired, treating cache entry as a miss")
+            responses[i] = None
+    return responses
+
+def caching(use_cache: bool) -> bool:
+    """use_cache, except while recording LLM completions: every hit would be a prompt missing from the recording"""
+    return use_cache and settings.LLM_PROVIDER != "record"
+
+def should_cache(final_state: dict) -> bool:
+    """Only complete, successful answers are cached; sampled ones are not complete"""
+    return (
+        not final_state.get("error")
+        and not final_state.get("timed_out")
+        and (final_state.get("cost_estimate") or {}).get("action") != "sample"
+    )
+
+# Graph runs started by /query/batch, shared by all batches so concurrent
+# batches can't exhaust the DB pool or the LLM rate limit between them
+batch_slots = asyncio.Semaphore(max(1, min(settings.BATCH_CONCURRENCY, settings.DB_POOL_SIZE)))
+
+# Background stale-while-revalidate refreshes, by question
+_refresh_tasks: dict = {}
+
+async def get_cached_response(query: str, allow_stale: bool = False) -> Optional[dict]:
+    """Cached response for a question, flagged as cached"""
+    cached_result = await cache.get(query, allow_stale=allow_stale)
+    if handle_of(cached_result):
+        cached_result = (await drop_expired_handles([cached_result]))[0]
+    if cached_result:
+        cached_result["cached"] = True
+    return cached_result
+
+async def run_query(query: str, use_cache: bool, timeout: Optional[float] = None,
+                    record: bool = True) -> dict:
+    """Run a question through the agent graph and cache the response.
+    
+    A cached response also counts the question toward warm-up, unless
+    `record` is off (warm-up and background refreshes).
+    """
+    logger.info("Starting agent graph execution")
+    start = time.perf_counter()
+    final_state = await agent_graph.ainvoke(build_initial_state(query, use_cache, timeout))
+    model_router.record(final_state, time.perf_counter() - start)
+    response = await finish_response(final_state)
+
+    logger.info(f"Response data_summary: row_count={response['data_summary']['row_count']}, "
+               f"columns={response['data_summary']['columns']}, "
+               f"truncated={response['data_summary']['truncated']}, "
+               f"result_id={response['data_summary']['result_id']}")
+
+    # Cache successful results
+    if use_cache and should_cache(final_state):
+        await cache.set(query, response)
+        if record:
+            await cache.record_query(query)
+
+    return response
+
+async def answer_query(query: str, use_cache: bool, timeout: Optional[float] = None,
+                       record: bool = True) -> dict:
+    """Serve from cache, or run the graph once for all concurrent askers"""
+    use_cache = caching(use_cache)
+    if not use_cache:
+        return await run_query(query, use_cache=False, timeout=timeout)
+
+    cached_result = await get_cached_response(query, allow_stale=settings.CACHE_SWR_ENABLED)
+    if cached_result:
+        if cached_result.get("stale"):
+            logger.info("Returning stale cached result, refreshing in background")
+            schedule_refresh(query)
+        else:
+            logger.info("Returning cached result")
+        if record:
+            await cache.record_query(query)
+        return cached_result
+
+    if not settings.SINGLEFLIGHT_ENABLED:
+        return await run_query(query, use_cache=True, timeout=timeout, record=record)
+
+    # Keyed like the response cache, so questions sharing an entry share a run
+    return await singleflight.do(
+        normalize_question(query),
+        lambda: run_query(query, use_cache=True, timeout=timeout, record=record),
+        lookup=lambda: get_cached_response(query),
+    )
+
+def stage_event(node: str, state: dict) -> dict:
+    """The part of a node's output worth sending to a streaming client"""
+    if node in ("route_model", "escalate_model"):
+        data = {"route": state.get("model_route"), "model": state.get("llm_model")}
+    elif node in ("match_template", "extract_intent", "extract_intent_and_sql", "generate_sql"):
+        data = {"intent": state.get("intent"), "sql": state.get("sql_query")}
+    elif node == "validate_sql":
+        data = {"sql": state.get("sql_query"), "valid": state.get("sql_valid"), "error": state.get("sql_error")}
+    elif node == "check_cost":
+        data = {"sql": state.get("sql_query"), **(state.get("cost_estimate") or {}), "error": state.get("sql_error")}
+    elif node == "execute":
+        result = state.get("data")
+        # A preview: the full rows arrive with the result event (or its handle)
+        data_dict = result.to_columnar(settings.RESULT_PAGE_ROWS) if result is not None else {}
+        data = {
+            "row_count": data_dict.get("row_count", 0),
+            "columns": data_dict.get("columns", []),
+            "values": data_dict.get("values", []),
+            "truncated": data_dict.get("truncated", False),
+            "error": state.get("execution_error"),
+        }
+    elif node == "interpret":
+        data = {"type": (state.get("data_profile") or {}).get("type", "unknown")}
+    elif node == "plan_viz":
+        data = {"viz_plan": state.get("viz_plan")}
+    elif node == "generate_viz":
+        data = {"visualization_code": state.get("viz_code")}
+    else:
+        data = {"insight": state.get("insight")}
+    return {"event": node, "data": data}
+
+async def stream_query(query: str, use_cache: bool, timeout: Optional[float] = None) -> AsyncIterator[dict]:
+    """Answer a question as a sequence of events, one per finished graph node.
+    
+    The last event is always "result", carrying the same body as /query.
+    Cache hits skip straight to it.
+    """
+    use_cache = caching(use_cache)
+    if use_cache:
+        cached_result = await get_cached_response(query, allow_stale=settings.CACHE_SWR_ENABLED)
+        if cached_result:
+            if cached_result.get("stale"):
+                schedule_refresh(query)
+            await cache.record_query(query)
+            yield {"event": "result", "data": cached_result}
+            return
+    
+    state = build_initial_state(query, use_cache, timeout)
+    start = time.perf_counter()
+    async for update in agent_graph.astream(state, stream_mode="updates"):
+        for node, node_state in update.items():
+            state = {**state, **(node_state or {})}
+            yield stage_event(node, state)
+    model_router.record(state, time.perf_counter() - start)
+    
+    response = await finish_response(state)
+    if use_cache and should_cache(state):
+        await cache.set(query, response)
+        await cache.record_query(query)
+    yield {"event": "result", "data": response}
+
+async def answer_batch(queries: List[str], use_cache: bool,
+                       timeout: Optional[float] = None) -> AsyncIterator[dict]:
+    """Answer many questions, yielding each result as soon as it is ready.
+    
+    Duplicate questions run once; each event lists the positions in the
+    request it answers. Cache hits come first (one multi-get), then graph
+    runs for the misses in completion order, and finally a "done" summary.
+    """
+    use_cache = caching(use_cache)
+    positions: dict = {}
+    for i, query in enumerate(queries):
+        positions.setdefault(query, []).append(i)
+    unique = list(positions)
+    
+    misses = unique
+    if use_cache:
+        cached_results = await cache.get_many(unique, allow_stale=settings.CACHE_SWR_ENABLED)
+        cached_results = await drop_expired_handles(cached_results)
+        misses = []
+        await cache.record_queries([query for query, hit in zip(unique, cached_results) if hit])
+        for query, cached_result in zip(unique, cached_results):
+            if not cached_result:
+                misses.append(query)
+                continue
+            cached_result["cached"] = True
+            if cached_result.get("stale"):
+                schedule_refresh(query)
+            yield {"event": "result", "query": query, "indices": positions[query], "data": cached_result}
+    
+    async def run(query: str):
+        async with batch_slots:
+            try:
+                return query, await answer_query(query, use_cache, timeout), None
+            except Exception as e:
+                logger.error(f"Batch question failed: {query[:50]}...: {e}", exc_info=True)
+                return query, None, str(e)
+    
+    failed = 0
+    tasks = [asyncio.create_task(run(query)) for query in misses]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            query, response, error = await next_done
+            if error:
+                failed += 1
+                yield {"event": "error", "query": query, "indices": positions[query],
+                       "data": {"detail": f"Failed to process query: {error}"}}
+            else:
+                yield {"event": "result", "query": query, "indices": positions[query], "data": response}
+    finally:
+        # Client went away: don't keep running questions nobody will read
+        for task in tasks:
+            task.cancel()
+    
+    yield {"event": "done", "data": {
+        "questions": len(queries),
+        "unique": len(unique),
+        "cached": len(unique) - len(misses),
+        "executed": len(misses),
+        "failed": failed,
+    }}
+
+def schedule_refresh(query: str):
+    """Re-run a question in the background; at most one refresher per cache entry"""
+    key = normalize_question(query)
+    if key in _refresh_tasks:
+        return
+    task = asyncio.create_task(_refresh(query))
+    _refresh_tasks[key] = task
+    task.add_done_callback(lambda _: _refresh_tasks.pop(key, None))
+
+async def _refresh(query: str):
+    lease_name = f"refresh:{normalize_question(query)}"
+    token = await cache.acquire_lease(lease_name, settings.SINGLEFLIGHT_LEASE_TTL)
+    if not token:
+        logger.info(f"Another worker is already refreshing: {query[:50]}...")
+        return
+    try:
+        # Another worker may have refreshed it between our stale read and the lease
+        if await cache.get(query):
+            logger.info(f"Already refreshed: {query[:50]}...")
+            return
+        await run_query(query, use_cache=True, record=False)
+        logger.info(f"Refreshed stale cache entry: {query[:50]}...")
+    except Exception as e:
+        logger.error(f"Background refresh error: {e}", exc_info=True)
+    finally:
+        await cache.release_lease(lease_name, token)
@@ -1,64 +1,389 @@
-import redis
-import json
+import redis.asyncio as redis
+import asyncio
 import hashlib
-from typing import Optional, Any
+import time
+import uuid
+from typing import Optional, Any, Dict, List
 import logging
 from .config import get_settings
+from .database import compute_schema_version
+from .caching import LocalCache, StageCache, TableCache, encode_payload, decode_payload, normalize_question
+from .caching.breaker import CircuitBreaker
+from .results.store import ResultStore
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
 
+SCHEMA_VERSION_KEY = "analytics:schema_version"
+INVALIDATION_CHANNEL = "analytics:invalidate"
+EXPIRES_AT_FIELD = "__expires_at__"
+QUERY_HISTORY_KEY = "analytics:query_history"
+
+# Delete a lease only if we still own it
+RELEASE_LEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+def pool_exhausted(error: Exception) -> bool:
+    """Whether an error means no pooled connection was free in time"""
+    if not isinstance(error, redis.ConnectionError):
+        return False
+    # BlockingConnectionPool raises ConnectionError from the timed-out wait
+    return isinstance(error.__cause__, asyncio.TimeoutError) or "No connection available" in str(error)
+
 class RedisCache:
     def __init__(self):
-        self.client = redis.from_url(
+        # One shared pool per worker; callers wait briefly for a free connection
+        self.pool = redis.BlockingConnectionPool.from_url(
             settings.REDIS_URL,
-            decode_responses=True,
-            socket_connect_timeout=5,
-            socket_timeout=5,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            timeout=settings.REDIS_POOL_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            health_check_interval=30,
+            decode_responses=False,  # Payloads may be binary (see caching/codecs.py)
+        )
+        self.client = redis.Redis(connection_pool=self.pool)
+        
+        # Skip Redis entirely while it is unhealthy instead of paying the timeout
+        self.breaker = CircuitBreaker(
+            "Redis",
+            failure_threshold=settings.REDIS_BREAKER_THRESHOLD,
+            reset_timeout=settings.REDIS_BREAKER_RESET_TIMEOUT,
         )
         
-    def _generate_key(self, query: str, schema_version: str = "v1") -> str:
-        """Generate deterministic cache key"""
-        content = f"{query}:{schema_version}"
+        # Optional in-process L1 tier; Redis is L2
+        self.local = None
+        if settings.CACHE_L1_ENABLED:
+            self.local = LocalCache(
+                max_entries=settings.CACHE_L1_MAX_ENTRIES,
+                max_bytes=settings.CACHE_L1_MAX_BYTES,
+                ttl=settings.CACHE_L1_TTL,
+            )
+        self.l2_hits = 0
+        self.l2_misses = 0
+        self.stale_hits = 0
+        self.pool_saturated = 0
+        
+        self._schema_version = None
+        self._schema_version_expires = 0.0
+        self._listener = None
+        
+    def _generate_key(self, query: str, schema_version: str) -> str:
+        """Generate deterministic cache key; case and whitespace don't matter"""
+        content = f"{normalize_question(query)}:{schema_version}"
         return f"analytics:{hashlib.sha256(content.encode()).hexdigest()}"
     
-    def get(self, query: str) -> Optional[dict]:
-        """Retrieve cached result"""
+    def encode(self, value: Any) -> bytes:
+        """Serialize a payload with the configured codec"""
+        return encode_payload(value, settings.CACHE_CODEC, settings.CACHE_COMPRESS_MIN_BYTES)
+    
+    def decode(self, data: bytes) -> Any:
+        """Deserialize a payload written by any codec, including legacy JSON"""
+        return decode_payload(data)
+    
+    def available(self) -> bool:
+        """False while the circuit breaker is open"""
+        return self.breaker.allow()
+    
+    def _record_error(self, error: Exception):
+        """Count an error against Redis health, unless the pool was only busy.
+        
+        A wait for a pooled connection that times out says nothing about
+        Redis itself; opening the circuit on it would turn caching off
+        under exactly the load it is there for.
+        """
+        if pool_exhausted(error):
+            self.pool_saturated += 1
+            return
+        self.breaker.record_failure()
+    
+    async def execute(self, command: str, *args, **kwargs) -> Any:
+        """Run a Redis command and feed the outcome to the circuit breaker"""
         try:
-            key = self._generate_key(query)
-            data = self.client.get(key)
-            if data:
-                logger.info(f"Cache HIT for query: {query[:50]}...")
-                return json.loads(data)
-            logger.info(f"Cache MISS for query: {query[:50]}...")
+            result = await getattr(self.client, command)(*args, **kwargs)
+        except Exception as e:
+            self._record_error(e)
+            raise
+        self.breaker.record_success()
+        return result
+    
+    async def execute_pipeline(self, pipe) -> List[Any]:
+        """Send a pipeline in one round-trip, tracked by the circuit breaker"""
+        try:
+            result = await pipe.execute()
+        except Exception as e:
+            self._record_error(e)
+            raise
+        self.breaker.record_success()
+        return result
+    
+    async def get_schema_version(self) -> Optional[str]:
+        """Current schema version, computed from the database on first use.
+        
+        With the L1 tier enabled the version is also held in-process, kept
+        current by invalidation messages and re-read from Redis at least every
+        CACHE_L1_TTL seconds in case a message was missed.
+        """
+        if self.local and self._schema_version and time.monotonic() < self._schema_version_expires:
+            return self._schema_version
+        
+        version = await self.execute("get", SCHEMA_VERSION_KEY)
+        version = version.decode() if version else await self.refresh_schema_version()
+        self._remember_schema_version(version)
+        return version
+    
+    async def refresh_schema_version(self) -> Optional[str]:
+        """Recompute the schema version after DDL or data source changes.
+        
+        Every cached response is keyed by the version, so bumping it makes
+        all entries written against the old schema unreachable. The new
+        version is broadcast so other workers drop their L1 entries.
+        """
+        try:
+            version = await compute_schema_version()
+            await self.execute("set", SCHEMA_VERSION_KEY, version)
+            await self.execute("publish", INVALIDATION_CHANNEL, version)
+            self._remember_schema_version(version)
+            logger.info(f"Schema version set to {version}")
+            return version
+        except Exception as e:
+            logger.error(f"Schema version refresh error: {e}")
             return None
+    
+    def _remember_schema_version(self, version: Optional[str]):
+        if not self.local or not version:
+            return
+        if version != self._schema_version:
+            self.local.clear()
+        self._schema_version = version
+        self._schema_version_expires = time.monotonic() + settings.CACHE_L1_TTL
+    
+    def start_invalidation_listener(self):
+        """Subscribe to cross-worker invalidation messages (L1 only)"""
+        if not self.local or self._listener:
+            return
+        self._listener = asyncio.create_task(self._listen_for_invalidations())
+        logger.info("Cache invalidation listener started")
+    
+    async def stop_invalidation_listener(self):
+        if self._listener:
+            self._listener.cancel()
+            self._listener = None
+    
+    async def _listen_for_invalidations(self):
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        version = message["data"].decode()
+                        logger.info(f"Received schema version {version}")
+                        self._remember_schema_version(version)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Messages may have been missed while disconnected
+                logger.warning(f"Cache invalidation listener error: {e}")
+                self.local.clear()
+                self._schema_version = None
+                await asyncio.sleep(1.0)
+            finally:
+                await pubsub.aclose()
+    
+    def _wrap(self, value: dict, ttl: int) -> dict:
+        """Envelope recording when an entry stops being fresh"""
+        return {EXPIRES_AT_FIELD: time.time() + ttl, "value": value}
+    
+    def _unwrap(self, entry: dict, allow_stale: bool) -> Optional[dict]:
+        """Unpack an entry; expired ones come back flagged stale, or not at all"""
+        if EXPIRES_AT_FIELD not in entry:
+            return dict(entry)  # Written before entries carried an expiry
+        value = dict(entry["value"])
+        if time.time() >= entry[EXPIRES_AT_FIELD]:
+            if not allow_stale:
+                return None
+            self.stale_hits += 1
+            value["stale"] = True
+        return value
+    
+    async def get(self, query: str, allow_stale: bool = False) -> Optional[dict]:
+        """Retrieve cached result, checking L1 before Redis"""
+        results = await self.get_many([query], allow_stale)
+        return results[0]
+    
+    async def get_many(self, queries: List[str], allow_stale: bool = False) -> List[Optional[dict]]:
+        """Retrieve several cached results; L1 misses share one MGET.
+        
+        Entries past their TTL are only returned with allow_stale, flagged
+        with "stale": True; they stay in Redis for CACHE_STALE_TTL more
+        seconds when stale-while-revalidate is enabled.
+        """
+        results = [None] * len(queries)
+        if not queries or not self.available():
+            return results
+        try:
+            schema_version = await self.get_schema_version()
+            if not schema_version:
+                return results
+            keys = [self._generate_key(query, schema_version) for query in queries]
+            
+            pending = []
+            for i, key in enumerate(keys):
+                entry = self.local.get(key) if self.local else None
+                if entry is not None:
+                    logger.info(f"Cache HIT (L1) for query: {queries[i][:50]}...")
+                    results[i] = self._unwrap(entry, allow_stale)
+                else:
+                    pending.append(i)
+            if not pending:
+                return results
+            
+            payloads = await self.execute("mget", [keys[i] for i in pending])
+            for i, data in zip(pending, payloads):
+                if data:
+                    self.l2_hits += 1
+                    logger.info(f"Cache HIT for query: {queries[i][:50]}...")
+                    entry = self.decode(data)
+                    if self.local:
+                        self.local.set(keys[i], entry, size=len(data))
+                    results[i] = self._unwrap(entry, allow_stale)
+                else:
+                    self.l2_misses += 1
+                    logger.info(f"Cache MISS for query: {queries[i][:50]}...")
+            return results
         except Exception as e:
             logger.error(f"Redis GET error: {e}")
-            return None
+            return results
     
-    def set(self, query: str, value: dict, ttl: int = None) -> bool:
+    async def set(self, query: str, value: dict, ttl: int = None) -> bool:
         """Store result in cache"""
+        return await self.set_many({query: value}, ttl)
+    
+    async def set_many(self, items: Dict[str, dict], ttl: int = None) -> bool:
+        """Store several results in one pipelined round-trip"""
+        if not items or not self.available():
+            return False
         try:
-            key = self._generate_key(query)
+            schema_version = await self.get_schema_version()
+            if not schema_version:
+                return False
             ttl = ttl or settings.REDIS_TTL
-            self.client.setex(
-                key,
-                ttl,
-                json.dumps(value, default=str)  # Handle datetime/decimal
-            )
-            logger.info(f"Cached result for: {query[:50]}...")
+            # Keep expired entries around long enough to serve them stale
+            redis_ttl = ttl + (settings.CACHE_STALE_TTL if settings.CACHE_SWR_ENABLED else 0)
+            pipe = self.client.pipeline(transaction=False)
+            for query, value in items.items():
+                key = self._generate_key(query, schema_version)
+                entry = self._wrap(value, ttl)
+                payload = self.encode(entry)
+                pipe.setex(key, redis_ttl, payload)
+                if self.local:
+                    self.local.set(key, entry, size=len(payload), ttl=min(redis_ttl, settings.CACHE_L1_TTL))
+            await self.execute_pipeline(pipe)
+            logger.info(f"Cached {len(items)} result(s)")
             return True
         except Exception as e:
             logger.error(f"Redis SET error: {e}")
             return False
     
-    def health_check(self) -> bool:
+    async def record_query(self, query: str):
+        """Count a question in the query history used for cache warm-up"""
+        await self.record_queries([query])
+    
+    async def record_queries(self, queries: List[str]):
+        """Count several questions in the query history in one round-trip.
+        
+        Questions are counted in normalized form, and only the
+        QUERY_HISTORY_MAX most asked are kept.
+        """
+        if not queries or not self.available():
+            return
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for query in queries:
+                pipe.zincrby(QUERY_HISTORY_KEY, 1, normalize_question(query))
+            pipe.zremrangebyrank(QUERY_HISTORY_KEY, 0, -settings.QUERY_HISTORY_MAX - 1)
+            await self.execute_pipeline(pipe)
+        except Exception as e:
+            logger.error(f"Query history error: {e}")
+    
+    async def top_queries(self, n: int) -> List[str]:
+        """The n most frequently asked questions"""
+        if not self.available():
+            return []
+        try:
+            queries = await self.execute("zrevrange", QUERY_HISTORY_KEY, 0, n - 1)
+            return [query.decode() for query in queries]
+        except Exception as e:
+            logger.error(f"Query history error: {e}")
+            return []
+    
+    async def acquire_lease(self, name: str, ttl: int) -> Optional[str]:
+        """Take a cross-worker lease; returns its token, or None if it is held.
+        
+        When Redis is unavailable the lease is granted locally, so callers
+        degrade to per-worker coordination instead of blocking.
+        """
+        token = uuid.uuid4().hex
+        if not self.available():
+            return token
+        lease_key = f"analytics:lease:{hashlib.sha256(name.encode()).hexdigest()}"
+        try:
+            acquired = await self.execute("set", lease_key, token, nx=True, ex=ttl)
+            return token if acquired else None
+        except Exception as e:
+            logger.error(f"Lease acquire error: {e}")
+            return token
+    
+    async def release_lease(self, name: str, token: str):
+        """Release a lease, but only if we still hold it"""
+        if not self.available():
+            return
+        lease_key = f"analytics:lease:{hashlib.sha256(name.encode()).hexdigest()}"
+        try:
+            await self.execute("eval", RELEASE_LEASE_SCRIPT, 1, lease_key, token)
+        except Exception as e:
+            logger.error(f"Lease release error: {e}")
+    
+    def stats(self) -> dict:
+        """Per-tier hit/miss counters"""
+        return {
+            "l1": self.local.stats() if self.local else None,
+            "l2": {"hits": self.l2_hits, "misses": self.l2_misses},
+            "stale_hits": self.stale_hits,
+            "pool_saturated": self.pool_saturated,
+            "breaker": self.breaker.stats(),
+        }
+    
+    async def health_check(self) -> bool:
         """Check Redis connectivity"""
+        if not self.available():
+            return False
         try:
-            self.client.ping()
+            await self.execute("ping")
             return True
         except:
             return False
 
+    async def close(self):
+        await self.stop_invalidation_listener()
+        await self.client.aclose()
+
 # Singleton instance
-cache = RedisCache()
\ No newline at end of file
+cache = RedisCache()
+
+# Per-stage memoization, so a partial hit skips the expensive stages
+intent_cache = StageCache(cache, "intent", settings.INTENT_CACHE_TTL, versioned=True)
+sql_cache = StageCache(cache, "sql", settings.SQL_CACHE_TTL, versioned=True)
+# Result sets by canonical SQL, evicted per table rather than by schema version
+result_cache = TableCache(cache, "result", settings.RESULT_CACHE_TTL)
+llm_cache = StageCache(cache, "llm", settings.LLM_CACHE_TTL)
+cost_cache = StageCache(cache, "cost", settings.COST_CACHE_TTL, versioned=True)
+stage_caches = [intent_cache, sql_cache, result_cache, llm_cache, cost_cache]
+
+# Whole results behind the ids handed out by /query
+result_store = ResultStore(cache, settings.RESULT_HANDLE_TTL, settings.RESULT_CHUNK_ROWS)
\ No newline at end of file
@@ -0,0 +1,34 @@
+from .normalize import column_type_codes, normalize_rows
+from .buffer import ColumnBuffer
+from .resultset import ResultSet
+from .store import ResultStore, encode_cursor, decode_cursor
+from .formats import (
+    RECORDS,
+    COLUMNAR,
+    ARROW,
+    ARROW_MEDIA_TYPE,
+    COLUMNAR_MEDIA_TYPE,
+    negotiate,
+    format_summary,
+    format_response,
+    to_arrow,
+)
+
+__all__ = [
+    "column_type_codes",
+    "normalize_rows",
+    "ColumnBuffer",
+    "ResultSet",
+    "ResultStore",
+    "encode_cursor",
+    "decode_cursor",
+    "RECORDS",
+    "COLUMNAR",
+    "ARROW",
+    "ARROW_MEDIA_TYPE",
+    "COLUMNAR_MEDIA_TYPE",
+    "negotiate",
+    "format_summary",
+    "format_response",
+    "to_arrow",
+]
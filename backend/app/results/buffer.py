@@ -0,0 +1,54 @@
+"""Columnar accumulation of streamed result batches under a byte budget"""
+from typing import Any, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+from .normalize import normalize_rows
+from .resultset import ResultSet
+
+class ColumnBuffer:
+    """Collects normalized column chunks, one per fetched batch.
+
+    Driver rows only live for one batch: each is converted to typed columns
+    as it arrives, so peak memory is the kept result plus one batch. Once
+    the kept columns would exceed `max_bytes`, the batch is cut to the rows
+    that still fit and the buffer reports itself truncated.
+    """
+    
+    def __init__(self, columns: List[str], type_codes: List[Optional[int]], max_bytes: int):
+        self.columns = columns
+        self.type_codes = type_codes
+        self.max_bytes = max_bytes
+        self.chunks: List[pd.DataFrame] = []
+        self.nbytes = 0
+        self.row_count = 0
+        self.truncated = False
+    
+    def append(self, rows: Sequence[Sequence[Any]]) -> bool:
+        """Add a batch; False once the budget is spent and reading should stop"""
+        if self.truncated or not rows:
+            return not self.truncated
+        
+        chunk = normalize_rows(rows, self.columns, self.type_codes)
+        size = int(chunk.memory_usage(index=False, deep=True).sum())
+        if self.nbytes + size > self.max_bytes:
+            # Keep the rows that fit, assuming they are about the same size
+            fits = int(len(chunk) * (self.max_bytes - self.nbytes) / size) if size else len(chunk)
+            chunk = chunk.iloc[:max(fits, 0)]
+            size = int(chunk.memory_usage(index=False, deep=True).sum())
+            self.truncated = True
+        
+        if len(chunk):
+            self.chunks.append(chunk)
+            self.nbytes += size
+            self.row_count += len(chunk)
+        return not self.truncated
+    
+    def result(self) -> ResultSet:
+        """The kept rows, one array per column joined across batches"""
+        if not self.chunks:
+            return ResultSet.from_frame(normalize_rows([], self.columns, self.type_codes), self.truncated)
+        arrays = [
+            np.concatenate([chunk.iloc[:, i].to_numpy() for chunk in self.chunks])
+            for i in range(len(self.columns))
+        ]
+        return ResultSet(self.columns, arrays, self.truncated)
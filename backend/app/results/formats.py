@@ -0,0 +1,116 @@
+"""Wire layouts for query results, picked per request.
+
+Responses are built and cached columnar (``values``: one list per column).
+At the API boundary they are sent as:
+
+- records: ``data`` is a list of row objects (the original layout)
+- columnar: ``columns`` plus ``values``, each column name sent once
+- arrow: an Arrow IPC stream of the rows, with the rest of the response
+  as JSON in the schema metadata
+"""
+from typing import Any, List, Optional
+import json
+import pyarrow as pa
+
+RECORDS = "records"
+COLUMNAR = "columnar"
+ARROW = "arrow"
+FORMATS = (RECORDS, COLUMNAR, ARROW)
+
+COLUMNAR_MEDIA_TYPE = "application/vnd.analytics-agent.columnar+json"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+MEDIA_TYPES = {
+    "application/json": RECORDS,
+    COLUMNAR_MEDIA_TYPE: COLUMNAR,
+    ARROW_MEDIA_TYPE: ARROW,
+}
+
+# Schema metadata key holding the non-row fields of an Arrow response
+ARROW_METADATA_KEY = b"response"
+
+def negotiate(accept: Optional[str], requested: Optional[str] = None) -> str:
+    """Result format from an explicit `format` parameter or the Accept header.
+
+    Raises ValueError for an unknown `format`; an Accept header naming
+    nothing we serve falls back to records.
+    """
+    if requested:
+        if requested not in FORMATS:
+            raise ValueError(f"Unknown format: {requested} (expected one of {', '.join(FORMATS)})")
+        return requested
+    
+    ranges = []
+    for position, part in enumerate((accept or "").split(",")):
+        media_type, *params = [item.strip() for item in part.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        ranges.append((-quality, position, media_type.lower()))
+    
+    for negative_quality, _, media_type in sorted(ranges):
+        if negative_quality < 0 and media_type in MEDIA_TYPES:
+            return MEDIA_TYPES[media_type]
+    return RECORDS
+
+def _columns_and_values(summary: dict):
+    if "values" in summary:
+        return summary.get("columns", []), summary["values"]
+    # Records layout (cache entries from before responses were columnar)
+    columns = summary.get("columns", [])
+    rows = summary.get("data", [])
+    return columns, [[row.get(column) for row in rows] for column in columns]
+
+def to_records(columns: List[str], values: List[List[Any]]) -> List[dict]:
+    return [dict(zip(columns, row)) for row in zip(*values)]
+
+def format_summary(summary: dict, fmt: str) -> dict:
+    """data_summary in the records or columnar layout"""
+    if fmt == COLUMNAR:
+        if "values" in summary:
+            return summary
+        columns, values = _columns_and_values(summary)
+        rest = {key: value for key, value in summary.items() if key != "data"}
+        return {**rest, "columns": columns, "values": values}
+    
+    if "data" in summary:
+        return summary
+    rest = {key: value for key, value in summary.items() if key != "values"}
+    return {**rest, "data": to_records(summary.get("columns", []), summary.get("values", []))}
+
+def format_response(response: dict, fmt: str) -> dict:
+    """A /query response with its data_summary in the requested layout"""
+    if "data_summary" not in response:
+        return response
+    return {**response, "data_summary": format_summary(response["data_summary"], fmt)}
+
+def to_arrow(response: dict) -> bytes:
+    """A /query response as an Arrow IPC stream"""
+    summary = response.get("data_summary", {})
+    columns, values = _columns_and_values(summary)
+    
+    arrays = []
+    for column in values:
+        try:
+            arrays.append(pa.array(column))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Mixed Python types in one column: send it as text
+            arrays.append(pa.array([None if value is None else str(value) for value in column]))
+    
+    meta = {
+        **response,
+        "data_summary": {key: value for key, value in summary.items() if key not in ("data", "values")},
+    }
+    schema = pa.schema(
+        [pa.field(name, array.type) for name, array in zip(columns, arrays)],
+        metadata={ARROW_METADATA_KEY: json.dumps(meta, default=str).encode()},
+    )
+    table = pa.Table.from_arrays(arrays, schema=schema)
+    
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
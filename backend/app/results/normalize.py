@@ -0,0 +1,97 @@
+"""Column-at-a-time conversion of driver rows into JSON-ready pandas columns.
+
+The target type comes from the cursor description (PostgreSQL type OIDs,
+as reported by asyncpg), so no cell is inspected in Python: NUMERIC becomes
+float64, DATE and TIMESTAMP become ISO 8601 strings, formatted by numpy.
+
+Timestamps always carry microseconds ("2024-01-01T12:00:00.000000"), and
+TIMESTAMPTZ is given in UTC with a "+00:00" offset, as asyncpg returns it.
+"""
+from typing import Any, List, Optional, Sequence
+import datetime
+import decimal
+import numpy as np
+import pandas as pd
+
+# PostgreSQL type OIDs (pg_type.oid)
+INT_OIDS = {20, 21, 23, 26}  # int8, int2, int4, oid
+FLOAT_OIDS = {700, 701, 1700}  # float4, float8, numeric
+DATE_OID = 1082
+TIMESTAMP_OID = 1114
+TIMESTAMPTZ_OID = 1184
+
+def column_type_codes(result) -> List[Optional[int]]:
+    """Type OID of each result column, None where the driver doesn't say"""
+    # AsyncResult (from AsyncSession.stream) wraps the cursor result
+    result = getattr(result, "_real_result", result)
+    description = getattr(getattr(result, "cursor", None), "description", None) or []
+    return [column[1] if isinstance(column[1], int) else None for column in description]
+
+def _sniff(values: Sequence[Any]) -> Optional[int]:
+    """Type OID for a column the driver gave no type for, from its first value"""
+    first = next((value for value in values if value is not None), None)
+    if isinstance(first, decimal.Decimal):
+        return 1700
+    if isinstance(first, datetime.datetime):
+        return TIMESTAMPTZ_OID if first.tzinfo else TIMESTAMP_OID
+    if isinstance(first, datetime.date):
+        return DATE_OID
+    return None
+
+def _iso_strings(series: pd.Series, unit: str, suffix: str = "") -> pd.Series:
+    values = series.to_numpy(dtype=f"datetime64[{unit}]")
+    formatted = np.datetime_as_string(values, unit=unit)
+    if suffix:
+        formatted = np.char.add(formatted, suffix)
+    out = formatted.astype(object)
+    out[np.isnat(values)] = None
+    return pd.Series(out, index=series.index, dtype=object)
+
+def _timestamps(values: Sequence[Any], utc: bool) -> pd.Series:
+    series = pd.to_datetime(pd.Series(values, dtype=object), utc=utc)
+    if utc:
+        series = series.dt.tz_convert(None)
+    # Always microseconds: a column streamed in batches must format alike in all of them
+    return _iso_strings(series, "us", "+00:00" if utc else "")
+
+def normalize_column(values: Sequence[Any], type_code: Optional[int]) -> pd.Series:
+    """One result column as a pandas Series of JSON-serializable values"""
+    if type_code is None:
+        type_code = _sniff(values)
+    
+    try:
+        if type_code in FLOAT_OIDS:
+            return pd.Series(values, dtype="float64")
+        if type_code in INT_OIDS:
+            series = pd.Series(values)
+            # NULLs would make it float64; keep the ints as ints instead
+            return series if series.dtype == "int64" else pd.Series(values, dtype=object)
+        if type_code == DATE_OID:
+            return _iso_strings(pd.to_datetime(pd.Series(values, dtype=object)), "D")
+        if type_code == TIMESTAMP_OID:
+            return _timestamps(values, utc=False)
+        if type_code == TIMESTAMPTZ_OID:
+            return _timestamps(values, utc=True)
+    except (TypeError, ValueError, OverflowError, pd.errors.OutOfBoundsDatetime):
+        # e.g. infinity dates or NaN numerics: keep the driver's values
+        return pd.Series(
+            [value.isoformat() if isinstance(value, datetime.date) else value for value in values],
+            dtype=object,
+        )
+    
+    return pd.Series(values, dtype=object)
+
+def normalize_rows(rows: Sequence[Sequence[Any]], columns: List[str],
+                   type_codes: List[Optional[int]]) -> pd.DataFrame:
+    """DataFrame of normalized columns built from driver rows"""
+    if type_codes is None or len(type_codes) != len(columns):
+        type_codes = [None] * len(columns)
+    values_by_column = list(zip(*rows)) if rows else [()] * len(columns)
+    
+    frame = pd.DataFrame({
+        i: normalize_column(values, type_code)
+        for i, (values, type_code) in enumerate(zip(values_by_column, type_codes))
+    })
+    # Positional keys first, then names: duplicate column names survive
+    frame.columns = columns
+    return frame
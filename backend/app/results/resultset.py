@@ -0,0 +1,113 @@
+"""Immutable columnar query result shared by the agent nodes"""
+from typing import Any, Dict, Iterator, List, Optional
+import numpy as np
+import pandas as pd
+
+# Rows converted to Python values per step when iterating
+ROW_CHUNK = 1024
+
+def _to_list(array: np.ndarray) -> List[Any]:
+    """Python values for JSON, with NaN as None"""
+    if array.dtype.kind == "f":
+        missing = np.isnan(array)
+        if missing.any():
+            values = array.astype(object)
+            values[missing] = None
+            return values.tolist()
+    return array.tolist()
+
+class ResultSet:
+    """Column names plus one read-only numpy array per column.
+
+    Made once by execute_query and passed by reference through the graph:
+    the nodes after it read columns, dtypes and row views from the same
+    arrays. Python values for the response are built at most once, by
+    values(), when the response is shaped.
+    """
+    
+    __slots__ = ("columns", "arrays", "truncated", "_values")
+    
+    def __init__(self, columns: List[str], arrays: List[np.ndarray], truncated: bool = False):
+        for array in arrays:
+            array.flags.writeable = False
+        self.columns = tuple(columns)
+        self.arrays = tuple(arrays)
+        self.truncated = truncated
+        self._values: Optional[List[List[Any]]] = None
+    
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame, truncated: bool = False) -> "ResultSet":
+        arrays = [frame.iloc[:, i].to_numpy() for i in range(frame.shape[1])]
+        return cls(list(frame.columns), arrays, truncated)
+    
+    @property
+    def row_count(self) -> int:
+        return len(self.arrays[0]) if self.arrays else 0
+    
+    def column(self, name: str) -> np.ndarray:
+        return self.arrays[self.columns.index(name)]
+    
+    def dtypes(self) -> Dict[str, str]:
+        return {name: str(array.dtype) for name, array in zip(self.columns, self.arrays)}
+    
+    def rows(self, start: int = 0, stop: Optional[int] = None) -> Iterator[dict]:
+        """Lazy row dicts over a slice, converted ROW_CHUNK rows at a time"""
+        start, stop, _ = slice(start, stop).indices(self.row_count)
+        for offset in range(start, stop, ROW_CHUNK):
+            end = min(offset + ROW_CHUNK, stop)
+            values = [_to_list(array[offset:end]) for array in self.arrays]
+            for row in zip(*values):
+                yield dict(zip(self.columns, row))
+    
+    def head(self, n: int) -> List[dict]:
+        return list(self.rows(0, n))
+    
+    def to_frame(self) -> pd.DataFrame:
+        frame = pd.DataFrame({i: array for i, array in enumerate(self.arrays)})
+        frame.columns = list(self.columns)
+        return frame
+    
+    def values(self) -> List[List[Any]]:
+        """Each column as a list of JSON-ready Python values, built once"""
+        if self._values is None:
+            self._values = [_to_list(array) for array in self.arrays]
+        return self._values
+    
+    def slice_values(self, start: int, stop: int) -> List[List[Any]]:
+        """JSON-ready values of each column for rows [start, stop)"""
+        if self._values is not None:
+            return [values[start:stop] for values in self._values]
+        return [_to_list(array[start:stop]) for array in self.arrays]
+    
+    def to_columnar(self, limit: Optional[int] = None) -> dict:
+        """The columnar /query data_summary fields (records are built per request).
+        
+        With `limit`, values covers only the first `limit` rows; row_count
+        is still the size of the whole result.
+        """
+        return {
+            "columns": list(self.columns),
+            "values": self.values() if limit is None else self.slice_values(0, limit),
+            "row_count": self.row_count,
+            "truncated": self.truncated,
+        }
+    
+    def to_payload(self) -> dict:
+        """Columnar form for the result cache"""
+        return {
+            "columns": list(self.columns),
+            "dtypes": [array.dtype.str if array.dtype.kind in "biuf" else "O" for array in self.arrays],
+            "values": self.values(),
+            "truncated": self.truncated,
+        }
+    
+    @classmethod
+    def from_payload(cls, payload: dict) -> "ResultSet":
+        # None in a float column comes back as NaN; fromiter keeps
+        # list-valued cells (Postgres arrays) as single objects
+        arrays = [
+            np.fromiter(values, dtype=object, count=len(values)) if dtype == "O"
+            else np.array(values, dtype=np.dtype(dtype))
+            for values, dtype in zip(payload["values"], payload["dtypes"])
+        ]
+        return cls(payload["columns"], arrays, payload.get("truncated", False))
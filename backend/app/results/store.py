@@ -0,0 +1,161 @@
+"""Server-side result sets behind /query result handles.
+
+A result larger than one page is written once to a Redis hash: a "meta"
+field (columns, row count, chunk size) plus one field per `chunk_rows`
+rows of columnar values. /query inlines the first page and hands out the
+id; a page read fetches only the chunks it overlaps, so its cost depends
+on the page size, not on the size of the result.
+"""
+from typing import List, Optional
+import base64
+import logging
+import uuid
+from .resultset import ResultSet
+
+logger = logging.getLogger(__name__)
+
+META_FIELD = "meta"
+
+def encode_cursor(result_id: str, row: int) -> str:
+    """Opaque position of the next unread row, bound to one result"""
+    return base64.urlsafe_b64encode(f"{result_id}:{row}".encode()).decode().rstrip("=")
+
+def decode_cursor(result_id: str, cursor: str) -> int:
+    """Row a cursor points at; ValueError if it is malformed or from another result"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        owner, row = base64.urlsafe_b64decode(padded).decode().rsplit(":", 1)
+        row = int(row)
+    except Exception:
+        raise ValueError("Malformed cursor")
+    if owner != result_id or row < 0:
+        raise ValueError("Cursor does not belong to this result")
+    return row
+
+class ResultStore:
+    """Stores whole results in Redis and serves them back page by page"""
+    
+    def __init__(self, cache, ttl: int, chunk_rows: int):
+        self.cache = cache
+        self.ttl = ttl
+        self.chunk_rows = max(1, chunk_rows)
+        self.stored = 0
+        self.stored_bytes = 0
+        self.pages = 0
+        self.expired = 0
+        self.errors = 0
+    
+    def _key(self, result_id: str) -> str:
+        return f"analytics:results:{result_id}"
+    
+    async def put(self, result: ResultSet) -> Optional[str]:
+        """Store a result; its id, or None when Redis is unavailable"""
+        if not self.cache.available():
+            return None
+        result_id = uuid.uuid4().hex
+        try:
+            mapping = {META_FIELD: self.cache.encode({
+                "columns": list(result.columns),
+                "row_count": result.row_count,
+                "truncated": result.truncated,
+                "chunk_rows": self.chunk_rows,
+            })}
+            for chunk, start in enumerate(range(0, result.row_count, self.chunk_rows)):
+                mapping[str(chunk)] = self.cache.encode(result.slice_values(start, start + self.chunk_rows))
+            
+            key = self._key(result_id)
+            pipe = self.cache.client.pipeline(transaction=False)
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, self.ttl)
+            await self.cache.execute_pipeline(pipe)
+            
+            self.stored += 1
+            self.stored_bytes += sum(len(payload) for payload in mapping.values())
+            logger.info(f"Stored result {result_id}: {result.row_count} rows in {len(mapping) - 1} chunk(s)")
+            return result_id
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Result store SET error: {e}")
+            return None
+    
+    async def page(self, result_id: str, start: int, limit: int,
+                   columns: Optional[List[str]] = None) -> Optional[dict]:
+        """Rows [start, start + limit) of a stored result, optionally a column subset.
+        
+        Returns None if the result has expired (or never existed); raises
+        ValueError for a column the result doesn't have.
+        """
+        key = self._key(result_id)
+        chunk_rows = self.chunk_rows
+        first, last = start // chunk_rows, (start + limit - 1) // chunk_rows
+        payloads = await self.cache.execute("hmget", key, [META_FIELD, *map(str, range(first, last + 1))])
+        if not payloads[0]:
+            self.expired += 1
+            return None
+        
+        meta = self.cache.decode(payloads[0])
+        if meta["chunk_rows"] != chunk_rows:
+            # Written with a different chunk size: fetch the chunks it used
+            chunk_rows = meta["chunk_rows"]
+            first, last = start // chunk_rows, (start + limit - 1) // chunk_rows
+            payloads = [None, *await self.cache.execute("hmget", key, list(map(str, range(first, last + 1))))]
+        
+        names = meta["columns"]
+        if columns:
+            missing = [name for name in columns if name not in names]
+            if missing:
+                raise ValueError(f"Unknown column(s): {', '.join(missing)}")
+            positions = [names.index(name) for name in columns]
+        else:
+            positions = list(range(len(names)))
+        
+        # Join the overlapping chunks, then cut the page out of them
+        values = [[] for _ in positions]
+        for payload in payloads[1:]:
+            if not payload:
+                break  # Past the last row
+            chunk = self.cache.decode(payload)
+            for out, position in zip(values, positions):
+                out.extend(chunk[position])
+        offset = start - first * chunk_rows
+        values = [column[offset:offset + limit] for column in values]
+        
+        end = min(start + limit, meta["row_count"])
+        self.pages += 1
+        return {
+            "result_id": result_id,
+            "columns": [names[position] for position in positions],
+            "values": values,
+            "row_count": meta["row_count"],
+            "start": start,
+            "truncated": meta["truncated"],
+            "next_cursor": encode_cursor(result_id, end) if end < meta["row_count"] else None,
+        }
+    
+    async def touch(self, result_ids: List[str]) -> List[bool]:
+        """Renew the TTL of several results in one round-trip; False for expired ones"""
+        if not result_ids:
+            return []
+        if not self.cache.available():
+            return [False] * len(result_ids)
+        try:
+            pipe = self.cache.client.pipeline(transaction=False)
+            for result_id in result_ids:
+                pipe.expire(self._key(result_id), self.ttl)
+            alive = [bool(renewed) for renewed in await self.cache.execute_pipeline(pipe)]
+            self.expired += alive.count(False)
+            return alive
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Result store TTL error: {e}")
+            return [False] * len(result_ids)
+    
+    def stats(self) -> dict:
+        return {
+            "stored": self.stored,
+            "stored_bytes": self.stored_bytes,
+            "pages": self.pages,
+            "expired": self.expired,
+            "errors": self.errors,
+            "ttl": self.ttl,
+        }
@@ -0,0 +1,194 @@
+"""Pre-execution cost gate: EXPLAIN the validated SQL before running it"""
+from collections import defaultdict
+from typing import Optional, Tuple
+import json
+import logging
+import sqlglot
+from sqlalchemy import text
+from ..config import get_settings
+from ..database import get_async_db
+from ..caching import canonical_sql
+from ..redis_client import cost_cache
+from ..deadline import out_of_time
+from .rules import SQLSafetyRules
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+ACTIONS = {"reject", "sample", "regenerate"}
+
+def plan_estimates(plan: dict) -> Tuple[float, float, Optional[str]]:
+    """(total cost, largest row estimate, largest scanned table) of an EXPLAIN plan.
+    
+    Rows is the biggest "Plan Rows" of any node, not the root's: a LIMIT
+    on top of a cross join reports few rows but still has to build them.
+    The table is the relation whose scan the planner expects to read the
+    most rows from, i.e. the one worth sampling.
+    """
+    cost = float(plan.get("Total Cost", 0.0))
+    rows = 0.0
+    table, table_rows = None, -1.0
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        node_rows = float(node.get("Plan Rows", 0.0))
+        rows = max(rows, node_rows)
+        if node.get("Relation Name") and node_rows > table_rows:
+            table, table_rows = node["Relation Name"], node_rows
+        stack.extend(node.get("Plans", []))
+    return cost, rows, table
+
+def sample_table(sql: str, table_name: str, percent: float) -> Optional[str]:
+    """The query with TABLESAMPLE SYSTEM (percent) on one table, None if it doesn't read it.
+    
+    Only the driving table is sampled: sampling both sides of a join keeps
+    percent² of the matching rows instead of percent.
+    """
+    parsed = sqlglot.parse_one(sql, read="postgres")
+    ctes = {cte.alias_or_name.lower() for cte in parsed.find_all(sqlglot.exp.CTE)}
+    for table in parsed.find_all(sqlglot.exp.Table):
+        name = table.name.lower()
+        if name != table_name.lower() or name in ctes or table.args.get("sample"):
+            continue
+        table.set("sample", sqlglot.exp.TableSample(
+            method=sqlglot.exp.var("SYSTEM"),
+            percent=sqlglot.exp.Literal.number(percent),
+        ))
+        return parsed.sql(dialect="postgres")
+    return None
+
+async def explain(sql: str) -> dict:
+    """Planner estimates for a query, cached by its canonical form.
+    
+    Estimates aren't part of the answer, so the cache is used even for
+    use_cache=False requests; it is versioned, so schema changes reset it.
+    """
+    cache_key = canonical_sql(sql)
+    estimate = await cost_cache.get(cache_key)
+    # Entries written before estimates named the largest table have no "table"
+    if estimate is not None and "table" in estimate:
+        return estimate
+    
+    async with get_async_db() as db:
+        result = await db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))
+        document = result.scalar()
+    if isinstance(document, str):
+        document = json.loads(document)
+    
+    cost, rows, table = plan_estimates(document[0]["Plan"])
+    estimate = {"cost": cost, "rows": rows, "table": table}
+    await cost_cache.set(cache_key, estimate)
+    return estimate
+
+class CostGate:
+    """Thresholds on planner estimates, and what happens to queries over them"""
+    
+    def __init__(self):
+        self.checked = 0
+        self.over = 0
+        self.actions = defaultdict(int)
+        self.errors = 0
+    
+    def over_limit(self, estimate: dict) -> Optional[str]:
+        """Why an estimate is over the thresholds, or None if it isn't"""
+        if estimate["cost"] > settings.COST_GATE_MAX_COST:
+            return f"estimated cost {estimate['cost']:,.0f} exceeds {settings.COST_GATE_MAX_COST:,.0f}"
+        if estimate["rows"] > settings.COST_GATE_MAX_ROWS:
+            return f"estimated {estimate['rows']:,.0f} rows exceeds {settings.COST_GATE_MAX_ROWS:,.0f}"
+        return None
+    
+    def action(self, state: dict) -> str:
+        """The configured action, falling back to reject when it was already tried"""
+        action = settings.COST_GATE_ACTION if settings.COST_GATE_ACTION in ACTIONS else "reject"
+        if action == "regenerate" and state.get("sql_feedback"):
+            # One rewrite per question; a second expensive query is refused
+            action = "reject"
+        return action
+    
+    def record(self, action: str):
+        self.actions[action] += 1
+    
+    def stats(self) -> dict:
+        return {
+            "checked": self.checked,
+            "over_threshold": self.over,
+            "actions": dict(self.actions),
+            "errors": self.errors,
+            "max_cost": settings.COST_GATE_MAX_COST,
+            "max_rows": settings.COST_GATE_MAX_ROWS,
+            "action": settings.COST_GATE_ACTION,
+        }
+
+cost_gate = CostGate()
+
+async def check_query_cost(state: dict) -> dict:
+    """Run EXPLAIN on the validated SQL and act on estimates over the limits.
+    
+    Over COST_GATE_MAX_COST or COST_GATE_MAX_ROWS, COST_GATE_ACTION decides:
+    "reject" fails the question, "sample" runs it on a TABLESAMPLE of its
+    largest table, and "regenerate" sends it back to the SQL generator once, with
+    the estimate as feedback. If EXPLAIN itself fails, the query is let
+    through and execute reports the real error.
+    """
+    sql_query = state.get("sql_query")
+    if not sql_query or out_of_time(state, settings.STAGE_MIN_BUDGET):
+        # Clear any estimate left from an earlier round
+        return {"cost_estimate": None}
+    
+    try:
+        estimate = await explain(sql_query)
+    except Exception as e:
+        cost_gate.errors += 1
+        logger.warning(f"EXPLAIN failed, running the query unchecked: {e}")
+        return {"cost_estimate": None}
+    
+    cost_gate.checked += 1
+    reason = cost_gate.over_limit(estimate)
+    if not reason:
+        return {"cost_estimate": {**estimate, "action": "run"}}
+    
+    cost_gate.over += 1
+    action = cost_gate.action(state)
+    logger.warning(f"Query over cost threshold ({reason}); action: {action}")
+    
+    if action == "sample":
+        percent = settings.COST_GATE_SAMPLE_PERCENT
+        try:
+            sampled_sql = sample_table(sql_query, estimate["table"], percent) if estimate["table"] else None
+            if sampled_sql:
+                # The rewrite is what runs, so it must pass the same checks as the original
+                is_valid, errors = SQLSafetyRules.validate_query(sampled_sql)
+                if not is_valid:
+                    logger.warning(f"Sampled query failed validation: {'; '.join(errors)}")
+                    sampled_sql = None
+            sampled = await explain(sampled_sql) if sampled_sql else None
+        except Exception as e:
+            cost_gate.errors += 1
+            logger.warning(f"Could not plan a sampled query: {e}")
+            sampled = None
+        if sampled is not None and not cost_gate.over_limit(sampled):
+            cost_gate.record("sample")
+            logger.info(f"Running on a {percent}% sample of {estimate['table']}: {sampled_sql}")
+            return {
+                "sql_query": sampled_sql,
+                "cost_estimate": {**sampled, "action": "sample", "percent": percent, "table": estimate["table"]},
+            }
+        action = "reject"
+    
+    cost_gate.record(action)
+    if action == "regenerate":
+        return {
+            "cost_estimate": {**estimate, "action": "regenerate"},
+            "sql_valid": False,
+            "sql_feedback": (
+                f"This SQL was too expensive to run ({reason}):\n{sql_query}\n"
+                "Write a cheaper query: filter or aggregate early, and avoid cross joins "
+                "and scans of large tables that the question doesn't need."
+            ),
+        }
+    
+    return {
+        "cost_estimate": {**estimate, "action": "reject"},
+        "sql_valid": False,
+        "sql_error": f"Query too expensive to run: {reason}",
+    }
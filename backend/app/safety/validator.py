@@ -8,12 +8,11 @@ def validate_sql_safety(state: dict) -> dict:
     """Validate SQL query for safety"""
     
     if state.get("sql_error") or state.get("error"):
-        return state
+        return {}
     
     sql_query = state.get("sql_query")
     if not sql_query:
         return {
-            **state,
             "sql_valid": False,
             "sql_error": "No SQL query to validate"
         }
@@ -24,7 +23,6 @@ def validate_sql_safety(state: dict) -> dict:
     
     if is_valid:
         return {
-            **state,
             "sql_valid": True,
             "sql_error": None
         }
@@ -32,7 +30,6 @@ def validate_sql_safety(state: dict) -> dict:
         error_msg = "; ".join(errors)
         logger.error(f"SQL validation failed: {error_msg}")
         return {
-            **state,
             "sql_valid": False,
             "sql_error": error_msg
         }
\ No newline at end of file
@@ -0,0 +1,161 @@
+"""Question-relevant slice of the schema for LLM prompts"""
+from collections import defaultdict
+from typing import Dict, List, Optional, Set
+import math
+import re
+
+# Bookkeeping tables that are never queried by the agent
+EXCLUDED_TABLES = {"data_sources"}
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "did", "do", "does", "each", "for",
+    "from", "give", "has", "have", "how", "i", "in", "is", "it", "list", "many", "me",
+    "most", "much", "of", "on", "or", "per", "show", "than", "that", "the", "their",
+    "there", "these", "this", "to", "top", "was", "were", "what", "when", "where",
+    "which", "who", "with",
+}
+
+# Business words -> words that appear in column names
+SYNONYMS = {
+    "revenue": ["amount", "total", "sales", "price"],
+    "sales": ["amount", "revenue", "quantity", "order"],
+    "spend": ["amount", "total"],
+    "sold": ["quantity", "order"],
+    "bestselling": ["quantity", "product"],
+    "buyer": ["customer"],
+    "client": ["customer"],
+    "user": ["customer"],
+    "item": ["product"],
+    "trend": ["date"],
+    "daily": ["date"],
+    "weekly": ["date"],
+    "monthly": ["date"],
+    "yearly": ["date"],
+    "day": ["date"],
+    "week": ["date"],
+    "month": ["date"],
+    "year": ["date"],
+}
+
+# Where a term matched, and how much that says about the table
+TABLE_WEIGHT = 3.0
+COLUMN_WEIGHT = 2.0
+DESCRIPTION_WEIGHT = 1.0
+
+# Tables scoring below this fraction of the best match are left out
+MIN_RELATIVE_SCORE = 0.2
+
+def _stem(token: str) -> str:
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased, singularized word tokens; identifiers split on underscores"""
+    words = re.findall(r"[a-z0-9]+", text.lower().replace("_", " "))
+    return [_stem(word) for word in words if word not in STOPWORDS]
+
+def _is_key(column: str) -> bool:
+    return column.lower() == "id" or column.lower().endswith("_id")
+
+class SchemaIndex:
+    """Inverted index from words to the tables and columns they appear in.
+
+    Built once per schema version. Selecting context is a handful of dict
+    lookups, so prompt size stays flat however many tables are loaded.
+    """
+    
+    def __init__(self, schema: Dict[str, List[dict]], descriptions: Optional[Dict[str, str]] = None):
+        self.schema = {table: columns for table, columns in schema.items() if table not in EXCLUDED_TABLES}
+        self.descriptions = {table: desc for table, desc in (descriptions or {}).items() if desc}
+        # token -> table -> weight, and token -> table -> matching columns
+        self.table_terms: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        self.column_terms: Dict[str, Dict[str, Set[str]]] = defaultdict(lambda: defaultdict(set))
+        
+        for table, columns in self.schema.items():
+            for token in tokenize(table):
+                self.table_terms[token][table] = max(self.table_terms[token][table], TABLE_WEIGHT)
+            for column in columns:
+                for token in tokenize(column["name"]):
+                    self.table_terms[token][table] = max(self.table_terms[token][table], COLUMN_WEIGHT)
+                    self.column_terms[token][table].add(column["name"])
+            for token in tokenize(self.descriptions.get(table, "")):
+                self.table_terms[token][table] = max(self.table_terms[token][table], DESCRIPTION_WEIGHT)
+    
+    def _query_terms(self, text: str) -> List[str]:
+        terms = []
+        for token in tokenize(text):
+            terms.append(token)
+            terms.extend(SYNONYMS.get(token, []))
+        return list(dict.fromkeys(terms))
+    
+    def score(self, text: str) -> Dict[str, float]:
+        """Relevance of each table to the text; rare terms count for more"""
+        scores: Dict[str, float] = defaultdict(float)
+        total = max(len(self.schema), 1)
+        for term in self._query_terms(text):
+            tables = self.table_terms.get(term)
+            if not tables:
+                continue
+            idf = math.log(1 + total / len(tables))
+            for table, weight in tables.items():
+                scores[table] += weight * idf
+        return scores
+    
+    def select(self, text: str, max_tables: int) -> List[str]:
+        """Most relevant tables, plus bridge tables needed to join them"""
+        scores = self.score(text)
+        ranked = sorted(scores, key=lambda table: (-scores[table], table))
+        if not ranked:
+            # Nothing matched; a small schema is cheap to send whole
+            return sorted(self.schema)[:max_tables]
+        
+        best = scores[ranked[0]]
+        selected = [table for table in ranked[:max_tables] if scores[table] >= best * MIN_RELATIVE_SCORE]
+        for i, left in enumerate(list(selected)):
+            for right in selected[i + 1:]:
+                if len(selected) >= max_tables:
+                    return selected
+                if self._shared_keys(left, right):
+                    continue
+                bridge = self._bridge(left, right)
+                if bridge and bridge not in selected:
+                    selected.append(bridge)
+        return selected
+    
+    def _keys(self, table: str) -> Set[str]:
+        return {column["name"] for column in self.schema.get(table, []) if _is_key(column["name"])}
+    
+    def _shared_keys(self, left: str, right: str) -> Set[str]:
+        return self._keys(left) & self._keys(right)
+    
+    def _bridge(self, left: str, right: str) -> Optional[str]:
+        for table in sorted(self.schema):
+            if table not in (left, right) and self._shared_keys(table, left) and self._shared_keys(table, right):
+                return table
+        return None
+    
+    def columns(self, table: str, text: str, max_columns: int) -> List[str]:
+        """Columns of a table worth showing: keys and matches first when pruning"""
+        names = [column["name"] for column in self.schema.get(table, [])]
+        if len(names) <= max_columns:
+            return names
+        
+        matched = set()
+        for term in self._query_terms(text):
+            matched |= self.column_terms.get(term, {}).get(table, set())
+        keep = [name for name in names if _is_key(name) or name in matched]
+        keep += [name for name in names if name not in keep]
+        keep = set(keep[:max_columns])
+        return [name for name in names if name in keep]
+    
+    def render(self, text: str, max_tables: int, max_columns: int) -> str:
+        """Prompt-ready schema lines for the tables relevant to the text"""
+        lines = []
+        for table in self.select(text, max_tables):
+            lines.append(f"- {table}: {', '.join(self.columns(table, text, max_columns))}")
+            if table in self.descriptions:
+                lines.append(f"  ({self.descriptions[table]})")
+        return "\n".join(lines)
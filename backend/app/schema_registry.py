@@ -0,0 +1,56 @@
+"""Live database schema, cached per schema version"""
+from typing import Optional
+import logging
+from .config import get_settings
+from .database import get_schema_info_async, get_table_descriptions
+from .redis_client import cache
+from .schema_context import SchemaIndex
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+class SchemaRegistry:
+    """Holds the last-read schema and its keyword index until the schema
+    version changes.
+
+    When Redis is unavailable (no version) the last schema is reused rather
+    than hitting information_schema on every question.
+    """
+    
+    def __init__(self):
+        self.version: Optional[str] = None
+        self.schema: Optional[dict] = None
+        self.index: Optional[SchemaIndex] = None
+    
+    async def _current_version(self) -> Optional[str]:
+        if not cache.available():
+            return None
+        try:
+            return await cache.get_schema_version()
+        except Exception as e:
+            logger.warning(f"Schema version unavailable: {e}")
+            return None
+    
+    async def get(self) -> dict:
+        version = await self._current_version()
+        if self.schema is not None and (version is None or version == self.version):
+            return self.schema
+        
+        schema = await get_schema_info_async()
+        descriptions = await get_table_descriptions()
+        logger.info(f"Loaded schema for version {version}: {len(schema)} tables")
+        self.version = version
+        self.schema = schema
+        self.index = SchemaIndex(schema, descriptions)
+        return schema
+
+    async def context(self, text: str) -> str:
+        """Schema lines relevant to a question, for LLM prompts"""
+        await self.get()
+        return self.index.render(
+            text,
+            max_tables=settings.SCHEMA_CONTEXT_MAX_TABLES,
+            max_columns=settings.SCHEMA_CONTEXT_MAX_COLUMNS,
+        )
+
+schema_registry = SchemaRegistry()
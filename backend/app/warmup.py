@@ -0,0 +1,101 @@
+"""Cache warm-up: replay the most frequently asked questions"""
+from typing import Optional
+import asyncio
+import logging
+import time
+from .config import get_settings
+from .redis_client import cache
+from .pipeline import answer_query
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+class CacheWarmer:
+    """Replays the top-N questions from query history with bounded concurrency.
+
+    The first completed run marks the worker ready, so the load balancer can
+    hold traffic until the hot set is cached. Later runs (after schema
+    changes) report progress but don't take the worker out of rotation.
+    """
+
+    def __init__(self, top_n: int, concurrency: int):
+        self.top_n = top_n
+        self.concurrency = concurrency
+        self.ready = not settings.WARMUP_ENABLED
+        self.status = "idle"
+        self.total = 0
+        self.completed = 0
+        self.failed = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._rerun = False
+
+    def start(self):
+        """Start a warm-up in the background, or queue one if already running"""
+        if not settings.WARMUP_ENABLED:
+            return
+        if self._task and not self._task.done():
+            self._rerun = True
+            return
+        self._task = asyncio.create_task(self._run_until_settled())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run_until_settled(self):
+        while True:
+            self._rerun = False
+            try:
+                await self.run()
+            except Exception as e:
+                logger.error(f"Cache warm-up error: {e}", exc_info=True)
+                self.status = "failed"
+            finally:
+                self.ready = True
+            if not self._rerun:
+                return
+
+    async def run(self):
+        queries = await cache.top_queries(self.top_n)
+        self.status = "running"
+        self.total = len(queries)
+        self.completed = 0
+        self.failed = 0
+        self.started_at = time.time()
+        self.finished_at = None
+        logger.info(f"Warming cache with {self.total} queries")
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def warm(query: str):
+            async with semaphore:
+                try:
+                    # Served from cache when still fresh; coalesced across workers
+                    await answer_query(query, use_cache=True, record=False)
+                    self.completed += 1
+                except Exception as e:
+                    self.failed += 1
+                    logger.warning(f"Warm-up failed for {query[:50]}...: {e}")
+
+        await asyncio.gather(*(warm(query) for query in queries))
+
+        self.status = "done"
+        self.finished_at = time.time()
+        logger.info(f"Cache warm-up finished: {self.completed}/{self.total} "
+                    f"in {self.finished_at - self.started_at:.1f}s")
+
+    def progress(self) -> dict:
+        return {
+            "ready": self.ready,
+            "status": self.status,
+            "total": self.total,
+            "completed": self.completed,
+            "failed": self.failed,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+warmer = CacheWarmer(top_n=settings.WARMUP_TOP_N, concurrency=settings.WARMUP_CONCURRENCY)
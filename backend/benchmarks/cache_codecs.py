@@ -0,0 +1,95 @@
+"""Benchmark cache payload codecs
+
+Builds the two payloads the cache stores for a query result with 10, 1k and
+10k rows, and reports encode time, decode time and stored bytes for the
+legacy JSON format and each msgpack codec, plus what "auto" picks:
+
+- response: the /query body as it is cached, columnar; past RESULT_PAGE_ROWS
+  only the first page is inline and the rest sits behind a result handle
+- result: the result cache entry, every row (ResultSet.to_payload)
+
+No Redis needed:
+
+    python -m benchmarks.cache_codecs
+"""
+import argparse
+import datetime
+import random
+import timeit
+
+import pandas as pd
+
+from app.caching.codecs import MAGIC, JSON, MSGPACK, MSGPACK_ZLIB, encode_payload, decode_payload
+from app.results import ResultSet
+
+CATEGORIES = ["Electronics", "Books", "Clothing", "Home", "Sports"]
+
+# RESULT_PAGE_ROWS default: rows inlined in a response with a result handle
+PAGE_ROWS = 500
+
+def build_result(rows: int) -> ResultSet:
+    """A ResultSet as execute_query builds it, with `rows` rows"""
+    rng = random.Random(rows)
+    start = datetime.date(2024, 1, 1)
+    return ResultSet.from_frame(pd.DataFrame({
+        "product_name": [f"Product {i}" for i in range(rows)],
+        "category": [rng.choice(CATEGORIES) for _ in range(rows)],
+        "order_date": [(start + datetime.timedelta(days=i % 365)).isoformat() for i in range(rows)],
+        "quantity": pd.Series([rng.randint(1, 50) for _ in range(rows)], dtype="int64"),
+        "revenue": pd.Series([round(rng.uniform(5, 5000), 2) for _ in range(rows)], dtype="float64"),
+    }))
+
+def build_response(result: ResultSet) -> dict:
+    """A response shaped like pipeline.build_response's"""
+    handle = result.row_count > PAGE_ROWS
+    data = result.to_columnar(PAGE_ROWS if handle else None)
+    return {
+        "sql": "SELECT product_name, category, order_date, quantity, revenue FROM sales LIMIT 10000",
+        "visualization_code": "import plotly.graph_objects as go\n" * 20,
+        "insight": f"Found {result.row_count} results.",
+        "data_summary": {
+            "row_count": data["row_count"],
+            "columns": data["columns"],
+            "type": "tabular",
+            "values": data["values"],
+            "truncated": data["truncated"],
+            "sampled": None,
+            "result_id": "0" * 32 if handle else None,
+            "next_cursor": "cursor" if handle else None,
+        },
+        "cached": False,
+        "partial": False,
+    }
+
+def time_call(fn, repeat: int) -> float:
+    """Best-of-3 mean time per call, in milliseconds"""
+    return min(timeit.repeat(fn, number=repeat, repeat=3)) / repeat * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cache payload codecs")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10, 1000, 10000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>6} {'payload':<9} {'codec':<14} {'bytes':>10} {'encode ms':>10} {'decode ms':>10}")
+    for rows in args.rows:
+        result = build_result(rows)
+        payloads = [("response", build_response(result)), ("result", result.to_payload())]
+        repeat = max(1, 20000 // max(rows, 1))
+        candidates = [
+            ("json", JSON.encode),
+            ("msgpack", MSGPACK.encode),
+            ("msgpack+zlib", MSGPACK_ZLIB.encode),
+            ("auto", encode_payload),
+        ]
+        for kind, value in payloads:
+            for name, encode in candidates:
+                data = encode(value)
+                assert decode_payload(data) == value
+                encode_ms = time_call(lambda: encode(value), repeat)
+                decode_ms = time_call(lambda: decode_payload(data), repeat)
+                if name == "auto":
+                    name = "auto (zlib)" if data[len(MAGIC)] == MSGPACK_ZLIB.id else "auto (raw)"
+                print(f"{rows:>6} {kind:<9} {name:<14} {len(data):>10} {encode_ms:>10.3f} {decode_ms:>10.3f}")
+
+if __name__ == "__main__":
+    main()
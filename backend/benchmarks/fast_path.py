@@ -0,0 +1,102 @@
+"""A/B benchmark: two-call (intent, then SQL) vs single-call fast path
+
+Runs the LLM stages of the agent graph against a stub chat model that
+sleeps for a fixed round-trip latency plus a per-token decode time, and
+reports the latency saved per request by AGENT_FAST_MODE:
+
+    python -m benchmarks.fast_path --requests 50 --latency-ms 350
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from types import SimpleNamespace
+
+from app.agents.nodes import intent, sql_generator, fast_path
+from app.llm import gateway
+from app.schema_context import SchemaIndex
+from app.schema_registry import schema_registry
+
+INTENT = {"metrics": ["total_amount"], "dimensions": ["product_name"], "filters": {},
+          "aggregation": "sum", "limit": 5}
+SCHEMA = {
+    "customers": ["customer_id", "customer_name", "email", "country", "signup_date"],
+    "products": ["product_id", "product_name", "category", "price", "stock_quantity"],
+    "orders": ["order_id", "customer_id", "order_date", "total_amount", "status"],
+    "order_items": ["item_id", "order_id", "product_id", "quantity", "unit_price"],
+}
+SQL = ("SELECT p.product_name, SUM(oi.quantity * oi.unit_price) AS revenue "
+       "FROM order_items oi JOIN products p ON p.product_id = oi.product_id "
+       "GROUP BY p.product_name ORDER BY revenue DESC LIMIT 5")
+
+class StubLLM:
+    """Chat model stand-in with a fixed latency profile, answering by system prompt"""
+    
+    def __init__(self, responses: dict, latency_ms: float, ms_per_token: float):
+        # System prompt template -> response; matched on the text before $schema
+        self.responses = {prompt.template.split("$schema")[0]: content
+                          for prompt, content in responses.items()}
+        self.latency_ms = latency_ms
+        self.ms_per_token = ms_per_token
+    
+    async def ainvoke(self, messages, **kwargs):
+        content = next(content for prefix, content in self.responses.items()
+                       if messages[0].content.startswith(prefix))
+        # Rough token count: ~4 characters per token
+        await asyncio.sleep((self.latency_ms + self.ms_per_token * len(content) / 4) / 1000)
+        return SimpleNamespace(content=content)
+
+async def run_standard(state: dict) -> dict:
+    # Nodes return only the keys they set, as LangGraph merges them
+    state = {**state, **await intent.extract_intent(state)}
+    return await sql_generator.generate_sql(state)
+
+async def run_fast(state: dict) -> dict:
+    return await fast_path.extract_intent_and_sql(state)
+
+async def measure(run, requests: int) -> list:
+    latencies = []
+    for i in range(requests):
+        state = {"user_query": f"Top 5 products by revenue #{i}", "use_cache": False}
+        start = time.perf_counter()
+        result = await run(state)
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert result["sql_query"] == SQL, result
+    return latencies
+
+def summarize(name: str, latencies: list):
+    ordered = sorted(latencies)
+    p95 = ordered[max(0, int(len(ordered) * 0.95) - 1)]
+    print(f"{name:<10} mean={statistics.mean(latencies):8.1f}ms "
+          f"p50={statistics.median(latencies):8.1f}ms p95={p95:8.1f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the single-call fast path")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=350.0,
+                        help="Round-trip latency of one LLM call")
+    parser.add_argument("--ms-per-token", type=float, default=2.0,
+                        help="Decode time per output token")
+    args = parser.parse_args()
+    
+    schema = {table: [{"name": column, "type": "text"} for column in columns]
+              for table, columns in SCHEMA.items()}
+    schema_registry.schema = schema
+    schema_registry.index = SchemaIndex(schema)
+    gateway.client = StubLLM({
+        intent.INTENT_SYSTEM_PROMPT: json.dumps(INTENT),
+        sql_generator.SQL_SYSTEM_PROMPT: SQL,
+        fast_path.FAST_SYSTEM_PROMPT: json.dumps({"intent": INTENT, "sql": SQL}),
+    }, args.latency_ms, args.ms_per_token)
+    
+    standard = asyncio.run(measure(run_standard, args.requests))
+    fast = asyncio.run(measure(run_fast, args.requests))
+    
+    summarize("standard", standard)
+    summarize("fast", fast)
+    saved = statistics.mean(standard) - statistics.mean(fast)
+    print(f"saved per request: {saved:.1f}ms ({saved / statistics.mean(standard):.0%})")
+
+if __name__ == "__main__":
+    main()
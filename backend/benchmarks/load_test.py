@@ -0,0 +1,97 @@
+"""Concurrent load test for the /query endpoint
+
+Fires a fixed number of /query requests at a running API with bounded
+concurrency and reports throughput and latency percentiles. Run it against
+the API before and after a change and compare the two reports:
+
+    python -m benchmarks.load_test --url http://localhost:8000 --concurrency 20 --requests 200
+
+Pass --no-cache so every request goes through the agent graph instead of
+being answered from Redis.
+"""
+import argparse
+import asyncio
+import itertools
+import statistics
+import time
+
+import httpx
+
+SAMPLE_QUERIES = [
+    "What were the top 5 products by revenue last month?",
+    "Show me daily order trends for the past week",
+    "Which product category has the highest average order value?",
+    "How many customers signed up per country?",
+]
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+async def run_load_test(url: str, queries: list, total: int, concurrency: int,
+                        use_cache: bool, timeout: float) -> dict:
+    """Send `total` requests with at most `concurrency` in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+    query_cycle = itertools.cycle(queries)
+
+    async with httpx.AsyncClient(base_url=url, timeout=timeout) as client:
+
+        async def one_request(query: str):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.post(
+                        "/query", json={"query": query, "use_cache": use_cache}
+                    )
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+                except Exception:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one_request(next(query_cycle)) for _ in range(total)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_mean_s": statistics.mean(latencies) if latencies else 0.0,
+        "latency_p50_s": percentile(latencies, 50),
+        "latency_p95_s": percentile(latencies, 95),
+        "latency_p99_s": percentile(latencies, 99),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the /query endpoint")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--query", action="append", help="Query to send (repeatable)")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the response cache")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load_test(
+        url=args.url,
+        queries=args.query or SAMPLE_QUERIES,
+        total=args.requests,
+        concurrency=args.concurrency,
+        use_cache=not args.no_cache,
+        timeout=args.timeout,
+    ))
+
+    for key, value in report.items():
+        print(f"{key:>16}: {value:.3f}" if isinstance(value, float) else f"{key:>16}: {value}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Benchmark result normalization in execute_query
+
+Builds driver-shaped rows (Decimal, date, timestamp, int and text columns)
+for a tall result (many rows, few columns) and a wide one (fewer rows, many
+columns), then times the previous per-cell conversion loop against the
+type-driven normalize_rows, both ending in row dicts. No database needed:
+
+    python -m benchmarks.result_normalization --rows 10000
+"""
+import argparse
+import datetime
+import decimal
+import random
+import timeit
+
+import pandas as pd
+
+from app.results import ResultSet, normalize_rows
+
+# (type OID, value factory) per column kind
+KINDS = [
+    (23, lambda rng, i: i),
+    (25, lambda rng, i: f"Product {i}"),
+    (1700, lambda rng, i: decimal.Decimal(f"{rng.uniform(5, 5000):.2f}")),
+    (1082, lambda rng, i: datetime.date(2024, 1, 1) + datetime.timedelta(days=i % 365)),
+    (1114, lambda rng, i: datetime.datetime(2024, 1, 1) + datetime.timedelta(seconds=i * 37)),
+]
+
+def build_result(rows: int, columns: int):
+    """Rows, column names and type OIDs, cycling through the column kinds"""
+    rng = random.Random(rows * columns)
+    kinds = [KINDS[c % len(KINDS)] for c in range(columns)]
+    names = [f"col_{c}" for c in range(columns)]
+    data = [tuple(make(rng, i) for _, make in kinds) for i in range(rows)]
+    return data, names, [oid for oid, _ in kinds]
+
+def legacy_normalize(rows, columns):
+    """execute_query's conversion before type-driven normalization"""
+    data = pd.DataFrame(rows, columns=columns)
+    for col in data.columns:
+        if data[col].dtype == 'object':
+            try:
+                data[col] = pd.to_numeric(data[col])
+            except:
+                pass
+            if any(isinstance(x, decimal.Decimal) for x in data[col] if x is not None):
+                data[col] = data[col].apply(lambda x: float(x) if isinstance(x, decimal.Decimal) else x)
+            if any(isinstance(x, (datetime.date, datetime.datetime)) for x in data[col] if x is not None):
+                data[col] = data[col].apply(lambda x: x.isoformat() if isinstance(x, (datetime.date, datetime.datetime)) else x)
+    return data.to_dict(orient="records")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark execute_query result normalization")
+    parser.add_argument("--rows", type=int, default=10000, help="Rows in the tall result")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    
+    shapes = [
+        ("tall", args.rows, len(KINDS)),
+        ("wide", max(args.rows // 10, 1), 10 * len(KINDS)),
+    ]
+    print(f"{'shape':<6} {'rows':>7} {'cols':>5} {'legacy ms':>10} {'typed ms':>10} {'speedup':>8}")
+    for name, rows, columns in shapes:
+        data, names, type_codes = build_result(rows, columns)
+        legacy = min(timeit.repeat(lambda: legacy_normalize(data, names), number=1, repeat=args.repeat))
+        typed = min(timeit.repeat(lambda: list(ResultSet.from_frame(normalize_rows(data, names, type_codes)).rows()),
+                                  number=1, repeat=args.repeat))
+        print(f"{name:<6} {rows:>7} {columns:>5} {legacy * 1000:>10.1f} {typed * 1000:>10.1f} "
+              f"{legacy / typed:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import asyncio
+import fakeredis
+import pytest
+from app.caching import TableCache, referenced_tables
+from app.redis_client import RedisCache
+
+@pytest.fixture
+def cache():
+    redis_cache = RedisCache()
+    redis_cache.client = fakeredis.FakeAsyncRedis()
+    return redis_cache
+
+@pytest.fixture
+def results(cache):
+    return TableCache(cache, "result", ttl=3600)
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+async def store(results, key, value, tables):
+    return await results.set(key, value, tables, await results.generations(tables))
+
+def test_invalidating_a_table_keeps_entries_for_other_tables(results):
+    async def scenario():
+        assert await store(results, "orders-by-day", {"rows": 1}, ["orders"])
+        assert await store(results, "top-products", {"rows": 2}, ["products"])
+        assert await store(results, "orders-by-product", {"rows": 3}, ["orders", "products"])
+        
+        assert await results.invalidate_tables(["Orders"]) == 2
+        return [await results.get(key) for key in ("orders-by-day", "top-products", "orders-by-product")]
+    
+    assert run(scenario()) == [None, {"rows": 2}, None]
+    assert results.stats()["evicted"] == 2
+
+def test_write_with_a_stale_generation_is_rejected(results):
+    async def scenario():
+        generations = await results.generations(["orders"])
+        # The table changes while the query is running
+        await results.invalidate_tables(["orders"])
+        stored = await results.set("orders-by-day", {"rows": 1}, ["orders"], generations)
+        return stored, await results.get("orders-by-day")
+    
+    assert run(scenario()) == (False, None)
+    assert results.stats()["rejected_writes"] == 1
+
+def test_write_without_generations_is_skipped(results):
+    assert run(results.set("orders-by-day", {"rows": 1}, ["orders"], None)) is False
+
+def test_dependents_sets_are_cleaned_up(cache, results):
+    async def scenario():
+        await store(results, "a", 1, ["orders"])
+        await store(results, "b", 2, ["orders", "customers"])
+        dependents = results._dependents_key("orders")
+        before = await cache.client.scard(dependents)
+        await results.invalidate_tables(["orders"])
+        return before, await cache.client.exists(dependents), await cache.client.ttl(results._dependents_key("customers"))
+    
+    before, exists, ttl = run(scenario())
+    assert before == 2
+    assert exists == 0
+    # Sets of tables not invalidated expire with their entries
+    assert 0 < ttl <= 3600
+
+def test_referenced_tables_excludes_cte_names():
+    sql = """
+        WITH recent AS (SELECT * FROM Orders WHERE order_date > now() - interval '7 days'),
+             totals AS (SELECT customer_id, SUM(total_amount) AS spend FROM recent GROUP BY 1)
+        SELECT c.customer_name, t.spend FROM totals t JOIN customers c USING (customer_id)
+    """
+    assert referenced_tables(sql) == ["customers", "orders"]
+
+def test_referenced_tables_of_unparseable_sql_is_empty():
+    assert referenced_tables("SELEC nonsense FROM") == []
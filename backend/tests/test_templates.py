@@ -0,0 +1,104 @@
+import asyncio
+from app.agents import templates
+from app.agents.templates import TemplateEngine
+from app.agents.nodes import template_matcher
+from app.schema_context import SchemaIndex
+
+def columns(*pairs):
+    return [{"name": name, "type": data_type} for name, data_type in pairs]
+
+SCHEMA = {
+    "customers": columns(
+        ("customer_id", "integer"), ("customer_name", "character varying"),
+        ("country", "character varying"), ("signup_date", "date"),
+    ),
+    "products": columns(
+        ("product_id", "integer"), ("product_name", "character varying"),
+        ("category", "character varying"), ("price", "numeric"),
+    ),
+    "orders": columns(
+        ("order_id", "integer"), ("customer_id", "integer"),
+        ("order_date", "date"), ("total_amount", "numeric"),
+    ),
+    "data_sources": columns(
+        ("id", "integer"), ("name", "text"), ("table_name", "text"), ("row_count", "integer"),
+    ),
+}
+
+def match(question, schema=SCHEMA):
+    return TemplateEngine().match(question, schema)
+
+def test_top_n_groups_entities_by_key_and_name():
+    result = match("Top 3 products by price?")
+    assert result.template == "top_n"
+    assert result.sql == (
+        'SELECT "product_name", SUM("price") AS total_price FROM "products" '
+        'GROUP BY "product_id", "product_name" ORDER BY total_price DESC NULLS LAST LIMIT 3'
+    )
+    assert result.intent["dimensions"] == ["product_name"]
+    assert result.intent["limit"] == 3
+
+def test_top_n_joins_the_metric_table_on_the_dimension_key():
+    result = match("show me the top 5 customers by total amount")
+    assert result.sql == (
+        'SELECT d."customer_name", SUM(m."total_amount") AS total_amount '
+        'FROM "customers" d JOIN "orders" m ON m."customer_id" = d."customer_id" '
+        'GROUP BY d."customer_id", d."customer_name" '
+        'ORDER BY total_amount DESC NULLS LAST LIMIT 5'
+    )
+
+def test_top_n_by_a_column_groups_by_its_values():
+    result = match("bottom 2 categories by average price")
+    assert result.sql == (
+        'SELECT "category", AVG("price") AS avg_price FROM "products" '
+        'GROUP BY "category" ORDER BY avg_price ASC NULLS LAST LIMIT 2'
+    )
+
+def test_top_n_counts_rows():
+    result = match("top 10 customers by number of orders")
+    assert result.sql == (
+        'SELECT d."customer_name", COUNT(*) AS order_count '
+        'FROM "customers" d JOIN "orders" m ON m."customer_id" = d."customer_id" '
+        'GROUP BY d."customer_id", d."customer_name" '
+        'ORDER BY order_count DESC NULLS LAST LIMIT 10'
+    )
+
+def test_top_n_rejects_limits_out_of_range():
+    assert match("top 0 products by price") is None
+    assert match(f"top {templates.settings.SQL_MAX_ROWS + 1} products by price") is None
+
+def test_metric_per_period():
+    for question in ("revenue per month", "Monthly revenue"):
+        result = match(question)
+        assert result.template == "metric_per_period"
+        assert result.sql == (
+            "SELECT DATE_TRUNC('month', \"order_date\")::date AS month, "
+            'SUM("total_amount") AS total_amount FROM "orders" '
+            'WHERE "order_date" IS NOT NULL '
+            f"GROUP BY 1 ORDER BY 1 LIMIT {templates.settings.SQL_MAX_ROWS}"
+        )
+        assert result.intent["time_range"] == "per month"
+
+def test_unmatched_questions_are_counted():
+    engine = TemplateEngine()
+    assert engine.match("why did sales drop last week", SCHEMA) is None
+    assert engine.match("top 5 planets by mass", SCHEMA) is None
+    assert engine.match("top 5 products by price", SCHEMA) is not None
+    assert engine.stats()["matched"] == 1
+    assert engine.stats()["unmatched"] == 2
+    assert engine.stats()["by_template"] == {"top_n": 1}
+
+def test_match_template_never_reads_bookkeeping_tables(monkeypatch):
+    # Would match data_sources.name / row_count if the raw schema were used
+    assert match("top 3 names by row_count") is not None
+    
+    async def get():
+        template_matcher.schema_registry.index = SchemaIndex(SCHEMA)
+        return SCHEMA
+    monkeypatch.setattr(template_matcher.schema_registry, "get", get)
+    
+    state = asyncio.run(template_matcher.match_template({"user_query": "top 3 names by row_count"}))
+    assert state == {}
+    state = asyncio.run(template_matcher.match_template({"user_query": "top 3 products by price"}))
+    assert state["sql_source"] == "template"
+    assert '"products"' in state["sql_query"]
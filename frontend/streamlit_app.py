@@ -48,6 +48,105 @@ st.markdown("""
 # API Configuration
 API_URL = "http://backend:8000"
 
+STAGE_LABELS = {
+    "match_template": "🧩 Matching question templates...",
+    "route_model": "🧭 Choosing a model...",
+    "escalate_model": "🔁 Retrying with the stronger model...",
+    "extract_intent": "🧠 Understanding the question...",
+    "extract_intent_and_sql": "🧠 Understanding the question...",
+    "generate_sql": "📝 Writing SQL...",
+    "validate_sql": "🛡️ Validating SQL...",
+    "check_cost": "💰 Estimating query cost...",
+    "execute": "⚙️ Running query...",
+    "interpret": "🔎 Interpreting results...",
+    "plan_viz": "📊 Planning visualization...",
+    "generate_viz": "📊 Building visualization...",
+    "generate_insight": "💡 Writing insight...",
+}
+
+def summary_frame(data_summary: dict) -> pd.DataFrame:
+    """DataFrame from a data_summary in the columnar layout (or records from older APIs)"""
+    if 'values' in data_summary:
+        frame = pd.DataFrame(dict(enumerate(data_summary['values'])))
+        frame.columns = data_summary['columns']
+        return frame
+    return pd.DataFrame(data_summary.get('data') or [])
+
+@st.cache_data(show_spinner=False, ttl=600)
+def fetch_result_rows(result_id: str, cursor: str) -> pd.DataFrame:
+    """Rows of a stored result from `cursor` to the end, fetched once per result"""
+    pages = []
+    while cursor:
+        response = requests.get(
+            f"{API_URL}/results/{result_id}",
+            params={"cursor": cursor, "limit": 5000, "format": "columnar"},
+            timeout=30
+        )
+        response.raise_for_status()
+        page = response.json()
+        pages.append(summary_frame(page))
+        cursor = page.get('next_cursor')
+    return pd.concat(pages, ignore_index=True)
+
+def full_result_frame(data_summary: dict) -> tuple:
+    """All rows of a result and whether they are complete.
+    
+    Falls back to the inline first page when the rest can't be fetched,
+    e.g. once the result handle has expired.
+    """
+    frame = summary_frame(data_summary)
+    cursor = data_summary.get('next_cursor')
+    if not cursor:
+        return frame, True
+    try:
+        rest = fetch_result_rows(data_summary['result_id'], cursor)
+    except requests.exceptions.RequestException:
+        return frame, False
+    return pd.concat([frame, rest], ignore_index=True), True
+
+def stream_query(query: str, use_cache: bool) -> dict:
+    """Run a query via /query/stream, previewing SQL and rows as they arrive"""
+    progress = st.empty()
+    sql_preview = st.empty()
+    data_preview = st.empty()
+    result = None
+    
+    try:
+        # (connect, read) timeouts; the read timeout applies between events
+        with requests.post(
+            f"{API_URL}/query/stream",
+            # Columnar rows: column names sent once, no per-row objects to rebuild
+            params={"format": "columnar"},
+            json={"query": query, "use_cache": use_cache},
+            stream=True,
+            timeout=(5, 60)
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                stage, data = event["event"], event["data"]
+                
+                if stage == "result":
+                    result = data
+                elif stage == "error":
+                    raise RuntimeError(data.get("detail", "Query failed"))
+                else:
+                    progress.info(STAGE_LABELS.get(stage, stage))
+                    if data.get("sql"):
+                        sql_preview.code(data["sql"], language="sql")
+                    if stage == "execute" and data.get("row_count"):
+                        data_preview.dataframe(summary_frame(data), use_container_width=True)
+    finally:
+        progress.empty()
+        sql_preview.empty()
+        data_preview.empty()
+    
+    if result is None:
+        raise RuntimeError("Query stream ended without a result")
+    return result
+
 # Initialize session state
 if 'query_history' not in st.session_state:
     st.session_state.query_history = []
@@ -263,13 +362,7 @@ with col2:
 if ask_button and query_input:
     with st.spinner("🤔 Thinking..."):
         try:
-            response = requests.post(
-                f"{API_URL}/query",
-                json={"query": query_input, "use_cache": use_cache},
-                timeout=30
-            )
-            response.raise_for_status()
-            result = response.json()
+            result = stream_query(query_input, use_cache)
             
             st.session_state.query_history.append({
                 'query': query_input,
@@ -281,6 +374,12 @@ if ask_button and query_input:
                 del st.session_state.current_query
             
             st.success("✅ Query executed successfully!")
+            if result.get('partial'):
+                st.warning("⏱️ Ran out of time - showing the results that were ready")
+            if result.get('data_summary', {}).get('truncated'):
+                st.warning("✂️ Result too large - showing the first rows only")
+            if result.get('data_summary', {}).get('sampled'):
+                st.warning(f"🎲 Query too expensive to run in full - computed on a {result['data_summary']['sampled']}% sample of its largest table - totals and counts are not scaled up")
             
             # Metrics
             col1, col2, col3 = st.columns(3)
@@ -316,8 +415,10 @@ if ask_button and query_input:
                 try:
                     data_summary = result.get('data_summary', {})
                     
-                    if 'data' in data_summary and data_summary['data']:
-                        data = pd.DataFrame(data_summary['data'])
+                    if data_summary.get('row_count'):
+                        data, complete = full_result_frame(data_summary)
+                        if not complete:
+                            st.info(f"📉 Only the first {len(data)} of {data_summary['row_count']} rows are plotted - the full result has expired")
                         
                         for col in data.columns:
                             try:
@@ -356,14 +457,16 @@ if ask_button and query_input:
             # Raw data
             with st.expander("📄 View Raw Data", expanded=False):
                 data_summary = result.get('data_summary', {})
-                if 'data' in data_summary and data_summary['data']:
-                    df = pd.DataFrame(data_summary['data'])
+                if data_summary.get('row_count'):
+                    df = summary_frame(data_summary)
+                    if data_summary.get('next_cursor'):
+                        st.caption(f"Showing the first {len(df)} of {data_summary['row_count']} rows; the CSV download has them all")
                     st.dataframe(df, use_container_width=True)
                     
-                    csv = df.to_csv(index=False)
                     st.download_button(
                         label="📥 Download as CSV",
-                        data=csv,
+                        # Built on click: the remaining pages are only fetched if needed
+                        data=lambda: full_result_frame(data_summary)[0].to_csv(index=False),
                         file_name=f"query_result_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
                         mime="text/csv"
                     )